@@ -87,14 +87,20 @@ def create_or_update_deployment(
         label="latest",
     )
 
+    request_timeout_ms = 5000
+
     request_settings = OnlineRequestSettings(
         max_concurrent_requests_per_instance=max_concurrency,
-        request_timeout_ms=5000,
+        request_timeout_ms=request_timeout_ms,
         max_queue_wait_ms=500,
     )
 
     environment_variables = {
         "WORKER_COUNT": max_concurrency,
+        "BATCH_SIZE": 64,
+        "BATCH_MAX_SIZE": 128,
+        "BATCH_MAX_WAIT_MS": 10,
+        "REQUEST_TIMEOUT_MS": request_timeout_ms,
         "TRANSLATOR_API_KEY": TRANSLATOR_API_KEY,
         "MODEL_NAME": model.name,
         "MODEL_VERSION": model.version,
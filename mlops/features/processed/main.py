@@ -1,14 +1,15 @@
 # %%
+import os
 from pathlib import Path
 
-import pandas as pd
-
 from mlops.features.processed.scripts.load import read_raw_file
 from mlops.features.processed.scripts.preprocess import (
-    coarse_gtin_to_length,
+    normalize_gtin,
     sanitize,
+    validate_gtin,
 )
-from mlops.features.processed.scripts.similarity import filter_similar_text
+from mlops.features.processed.scripts.similarity import filter_similar_text_by_market
+from mlops.features.scripts.storage import write_dataset
 
 # %%
 df = read_raw_file(
@@ -17,7 +18,7 @@ df = read_raw_file(
         "features",
         "raw",
         "data",
-        "data.csv",
+        "data.parquet",
     )
 )
 
@@ -28,10 +29,15 @@ df.info()
 df = sanitize(
     df,
     cols=["text"],
+    n_workers=os.cpu_count(),
 )
 
 # Make sure gtin length is 13
-df["gtin"] = df["gtin"].apply(coarse_gtin_to_length)
+df["gtin"] = normalize_gtin(df["gtin"], length=13)
+
+# Count GTINs with an invalid check digit as a data quality metric
+df["gtin_valid"] = validate_gtin(df["gtin"])
+print(f"{(~df['gtin_valid']).sum()=}")
 
 # Keep only rows with text length more than 3
 df = df[df["text"].apply(len) > 3]
@@ -40,25 +46,13 @@ df.info()
 
 # %%
 # Remove similar texts for each market
-markets = df["market"].unique()
-
-df_markets_keep = []
-df_markets_remove = []
-
-for market in markets:
-    df_market = df.query("market == @market").copy()
-    print(f"{market=}, {len(df_market)=}")
-
-    df_keep, df_remove = filter_similar_text(
-        df=df_market,
-        threshold=0.8,
-    )
-
-    df_markets_keep.append(df_keep)
-    df_markets_remove.append(df_remove)
+df_keep, df_remove, df_timings = filter_similar_text_by_market(
+    df=df,
+    threshold=0.8,
+    n_workers=os.cpu_count(),
+)
 
-df_keep = pd.concat(df_markets_keep)
-df_remove = pd.concat(df_markets_remove)
+print(df_timings)
 
 assert len(df_keep) + len(df_remove) == len(df)
 
@@ -126,26 +120,26 @@ len(df_keep[df_keep["label"].apply(len) > 1])
 df_keep = df_keep[df_keep["label"].apply(len) == 1]
 
 # %%
-df_keep.to_csv(
+write_dataset(
+    df_keep,
     Path(
         "mlops",
         "features",
         "processed",
         "data",
-        "data_keep.csv",
+        "data_keep.parquet",
     ),
-    index=True,
 )
 
-df_remove.to_csv(
+write_dataset(
+    df_remove,
     Path(
         "mlops",
         "features",
         "processed",
         "data",
-        "data_remove.csv",
+        "data_remove.parquet",
     ),
-    index=True,
 )
 
 # %%
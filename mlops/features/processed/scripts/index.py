@@ -0,0 +1,495 @@
+import json
+import logging
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from mlops.features.processed.scripts.minhash import (
+    compute_signatures,
+    get_band_buckets,
+)
+from mlops.features.processed.scripts.similarity import (
+    DisjointSet,
+    get_lsh_params,
+    get_representatives,
+    get_shingles,
+    num_perm,
+    representative_rules,
+)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="[%(asctime)s] %(message)s",
+    datefmt="%d/%m/%y %H:%M:%S",
+)
+
+
+class LSHIndex:
+    """MinHash LSH index of one market, persisted across runs.
+
+    Keeps the signature, cluster and keep flag of every row seen so far,
+    and the band buckets sorted per band, so a refresh only hashes new and
+    changed rows and only clusters the rows sharing their buckets
+    Rows are identified by a key column or index, e.g. 'pvid'
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        threshold: float,
+        rule: str = "longest_text",
+        shingling: str = "words",
+        recall: float = None,
+        key: str = "pvid",
+    ):
+        """Opens or creates the index.
+
+        Args:
+            path (Path): index directory
+            threshold (float): threshold to match on
+            rule (str, optional): rule choosing the row to keep per cluster,
+            one of representative_rules. Defaults to "longest_text".
+            shingling (str, optional): one of shingle_strategies.
+            Defaults to "words".
+            recall (float, optional): target recall at threshold to tune LSH for.
+            Defaults to None.
+            key (str, optional): column identifying rows. Defaults to "pvid".
+
+        Raises:
+            ValueError: if the index on disk was built with other parameters
+        """
+        self.path = path
+
+        self.params = {
+            "threshold": threshold,
+            "num_perm": num_perm,
+            "seed": 42,
+            "rule": rule,
+            "shingling": shingling,
+            "recall": recall,
+            "key": key,
+        }
+
+        self.bands, self.rows = get_lsh_params(
+            threshold=threshold,
+            recall=recall,
+        )
+
+        params_path = Path(path, "params.json")
+
+        if params_path.exists():
+            with params_path.open("r") as f:
+                params = json.load(f)
+
+            if params != self.params:
+                raise ValueError(
+                    f"Index {path=} was built with {params=}, not {self.params=}"
+                )
+
+            self.signatures = np.load(Path(path, "signatures.npy"))
+            self.buckets_sorted = np.load(Path(path, "buckets_sorted.npy"))
+            self.bucket_order = np.load(Path(path, "bucket_order.npy"))
+            self.df_rows = pd.read_parquet(Path(path, "rows.parquet"))
+
+        else:
+            self.signatures = np.empty((0, num_perm), dtype=np.uint64)
+            self.buckets_sorted = np.empty((self.bands, 0), dtype=np.uint64)
+            self.bucket_order = np.empty((self.bands, 0), dtype=np.int64)
+
+            self.df_rows = pd.DataFrame(
+                {
+                    "text_hash": pd.Series(dtype=np.uint64),
+                    "priority": pd.Series(dtype=object),
+                    "cluster_id": pd.Series(dtype=np.int64),
+                    "keep": pd.Series(dtype=bool),
+                    "parent": pd.Series(dtype=np.int64),
+                    "size": pd.Series(dtype=np.int64),
+                },
+                index=pd.Index([], name=key),
+            )
+
+        self.disjoint_set = DisjointSet(
+            n=len(self.df_rows),
+            parent=self.df_rows["parent"].to_list(),
+            size=self.df_rows["size"].to_list(),
+        )
+
+    def _get_buckets(
+        self,
+        signatures: np.ndarray,
+    ) -> np.ndarray:
+        return get_band_buckets(
+            signatures=signatures,
+            bands=self.bands,
+            rows=self.rows,
+        )
+
+    def _replace_buckets(
+        self,
+        positions_removed: np.ndarray,
+        positions_inserted: np.ndarray,
+        buckets: np.ndarray,
+    ):
+        # Removed and inserted rows are found by searching the sorted buckets,
+        # rows are inserted after the rows already in their bucket
+        n_rows = len(self.signatures)
+        is_removed = np.zeros(n_rows, dtype=bool)
+        is_removed[positions_removed] = True
+
+        buckets_sorted = []
+        bucket_order = []
+
+        for band in range(self.bands):
+            is_kept = ~is_removed[self.bucket_order[band]]
+            band_sorted = self.buckets_sorted[band, is_kept]
+            band_order = self.bucket_order[band, is_kept]
+
+            order = np.argsort(buckets[:, band], kind="stable")
+            positions = np.searchsorted(
+                band_sorted,
+                buckets[order, band],
+                side="right",
+            )
+
+            buckets_sorted.append(
+                np.insert(band_sorted, positions, buckets[order, band])
+            )
+            bucket_order.append(
+                np.insert(band_order, positions, positions_inserted[order])
+            )
+
+        self.buckets_sorted = np.stack(buckets_sorted)
+        self.bucket_order = np.stack(bucket_order)
+
+    def _link_rows(
+        self,
+        positions: np.ndarray,
+        buckets: np.ndarray,
+    ) -> np.ndarray:
+        # Each row is linked to the first row of each of its buckets
+        # Rows already indexed come first in a bucket and share a cluster,
+        # or all have their cluster rebuilt and are linked themselves
+        pairs = []
+
+        for band in range(self.bands):
+            first = np.searchsorted(self.buckets_sorted[band], buckets[:, band])
+            pairs.append(np.stack([positions, self.bucket_order[band, first]], axis=1))
+
+        pairs = np.concatenate(pairs)
+
+        for i, j in pairs.tolist():
+            self.disjoint_set.union(i, j)
+
+        return np.unique(pairs[:, 1])
+
+    def update(
+        self,
+        df: pd.DataFrame,
+    ) -> pd.DataFrame:
+        """Inserts new and changed rows and clusters them with the indexed rows.
+
+        A row with a key already in the index and another text replaces it,
+        the cluster it was in is rebuilt from its remaining rows
+        Only the buckets of new and changed rows are searched and only their
+        clusters have their representative chosen again
+
+        Expects df to have the key as a column or index and a column
+        called 'text'
+
+        Args:
+            df (pd.DataFrame): rows, new, changed or already indexed
+
+        Returns:
+            pd.DataFrame: new rows, changed rows and rows whose cluster or keep
+            flag changed, with 'cluster_id', 'keep', 'is_new' and 'is_changed'
+            columns, indexed by key
+        """
+        key = self.params["key"]
+
+        keys = df[key] if key in df.columns else df.index.to_series()
+
+        # The last row of a key holds its current text
+        is_last = ~keys.duplicated(keep="last").to_numpy()
+        df = df[is_last]
+        keys = keys[is_last].to_numpy()
+
+        text_hashes = pd.util.hash_pandas_object(df["text"], index=False).to_numpy()
+
+        n_old = len(self.df_rows)
+        positions = self.df_rows.index.get_indexer(keys)
+        is_new = positions < 0
+        n_new = int(is_new.sum())
+
+        is_changed = np.zeros(len(df), dtype=bool)
+        is_changed[~is_new] = (
+            self.df_rows["text_hash"].to_numpy()[positions[~is_new]]
+            != text_hashes[~is_new]
+        )
+
+        is_inserted = is_new | is_changed
+        df_inserted = df[is_inserted]
+
+        positions_changed = positions[is_changed]
+        positions[is_new] = n_old + np.arange(n_new)
+        positions_inserted = positions[is_inserted]
+
+        signatures = compute_signatures(
+            shingles=get_shingles(
+                texts=df_inserted["text"].to_list(),
+                shingling=self.params["shingling"],
+            ),
+            num_perm=num_perm,
+            seed=self.params["seed"],
+        )
+
+        buckets = self._get_buckets(signatures)
+
+        # Changed rows keep their position
+        self.signatures = np.concatenate(
+            [self.signatures, np.empty((n_new, num_perm), dtype=np.uint64)]
+        )
+        self.signatures[positions_inserted] = signatures
+
+        self._replace_buckets(
+            positions_removed=positions_changed,
+            positions_inserted=positions_inserted,
+            buckets=buckets,
+        )
+
+        # Columns set below, parent and size are set when saving
+        df_rows = pd.concat(
+            [
+                self.df_rows,
+                pd.DataFrame(
+                    {
+                        "text_hash": np.zeros(n_new, dtype=np.uint64),
+                        "priority": np.full(n_new, None, dtype=object),
+                        "cluster_id": n_old + np.arange(n_new),
+                        "keep": False,
+                        "parent": n_old + np.arange(n_new),
+                        "size": 1,
+                    },
+                    index=pd.Index(keys[is_new], name=key),
+                ),
+            ]
+        )
+
+        text_hash = df_rows["text_hash"].to_numpy(dtype=np.uint64, copy=True)
+        text_hash[positions_inserted] = text_hashes[is_inserted]
+
+        priority = df_rows["priority"].to_numpy(dtype=object, copy=True)
+        priority[positions_inserted] = representative_rules[self.params["rule"]](
+            df_inserted
+        ).to_numpy()
+
+        cluster_ids_before = df_rows["cluster_id"].to_numpy(dtype=np.int64)
+        keep_before = df_rows["keep"].to_numpy(dtype=bool)
+
+        # Other rows of the clusters of changed rows are clustered again,
+        # with the changed rows as new rows
+        positions_rebuilt = np.setdiff1d(
+            np.flatnonzero(
+                np.isin(cluster_ids_before, cluster_ids_before[positions_changed])
+            ),
+            positions_changed,
+        )
+
+        self.disjoint_set.extend(n_new)
+        self.disjoint_set.reset(
+            np.concatenate([positions_rebuilt, positions_changed]).tolist()
+        )
+
+        positions_linked = np.concatenate([positions_rebuilt, positions_inserted])
+
+        positions_first = self._link_rows(
+            positions=positions_linked,
+            buckets=np.concatenate(
+                [self._get_buckets(self.signatures[positions_rebuilt]), buckets]
+            ),
+        )
+
+        # A cluster is identified by its root row, which only changes
+        # when the cluster merges with another
+        cluster_ids = cluster_ids_before.copy()
+
+        roots_before = np.unique(cluster_ids_before[positions_first])
+        roots = np.array(
+            [self.disjoint_set.find(i) for i in roots_before.tolist()],
+            dtype=np.int64,
+        )
+
+        is_merged = roots != roots_before
+        is_moved = np.isin(cluster_ids_before, roots_before[is_merged])
+        cluster_ids[is_moved] = roots[is_merged][
+            np.searchsorted(roots_before[is_merged], cluster_ids_before[is_moved])
+        ]
+
+        cluster_ids[positions_linked] = [
+            self.disjoint_set.find(i) for i in positions_linked.tolist()
+        ]
+
+        affected = np.isin(cluster_ids, cluster_ids[positions_linked])
+        positions_affected = np.flatnonzero(affected)
+
+        positions_keep = positions_affected[
+            get_representatives(
+                cluster_ids=cluster_ids[affected],
+                priorities=priority[affected],
+            )
+        ]
+
+        keep = keep_before.copy()
+        keep[affected] = False
+        keep[positions_keep] = True
+
+        df_rows["text_hash"] = text_hash
+        df_rows["priority"] = priority
+        df_rows["cluster_id"] = cluster_ids
+        df_rows["keep"] = keep
+
+        self.df_rows = df_rows
+
+        is_changed_row = np.zeros(len(df_rows), dtype=bool)
+        is_changed_row[positions_changed] = True
+        is_new_row = np.arange(len(df_rows)) >= n_old
+
+        is_reported = (
+            (cluster_ids != cluster_ids_before)
+            | (keep != keep_before)
+            | is_changed_row
+            | is_new_row
+        )
+
+        df_changes = df_rows.loc[is_reported, ["cluster_id", "keep"]].assign(
+            is_new=is_new_row[is_reported],
+            is_changed=is_changed_row[is_reported],
+        )
+
+        logging.info(
+            f"{self.path=}, {n_new=}, {len(positions_changed)=}, "
+            f"{len(df_changes)=}, {self.stats()=}"
+        )
+
+        return df_changes
+
+    def save(self):
+        """Writes the index to temporary files and renames them once complete."""
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        self.df_rows["parent"] = self.disjoint_set.parent
+        self.df_rows["size"] = self.disjoint_set.size
+
+        for name, array in [
+            ("signatures.npy", self.signatures),
+            ("buckets_sorted.npy", self.buckets_sorted),
+            ("bucket_order.npy", self.bucket_order),
+        ]:
+            path_tmp = Path(self.path, f"{name}.tmp")
+
+            with path_tmp.open("wb") as f:
+                np.save(f, array)
+
+            path_tmp.replace(Path(self.path, name))
+
+        path_tmp = Path(self.path, "rows.parquet.tmp")
+        self.df_rows.to_parquet(path_tmp, index=True)
+        path_tmp.replace(Path(self.path, "rows.parquet"))
+
+        # Written last, an index without parameters is rebuilt from scratch
+        path_tmp = Path(self.path, "params.json.tmp")
+
+        with path_tmp.open("w") as f:
+            json.dump(self.params, f, indent=4)
+
+        path_tmp.replace(Path(self.path, "params.json"))
+
+    def stats(self) -> dict:
+        """Gets row, cluster and kept row counts.
+
+        Returns:
+            dict: index statistics
+        """
+        return {
+            "rows": len(self.df_rows),
+            "clusters": self.df_rows["cluster_id"].nunique(),
+            "rows_keep": int(self.df_rows["keep"].sum()),
+        }
+
+
+def update_similar_text_by_market(
+    df: pd.DataFrame,
+    index_dir: Path,
+    threshold: float,
+    rule: str = "longest_text",
+    shingling: str = "words",
+    recall: float = None,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Updates the index of each market with its new rows.
+
+    Each market has its index in '{index_dir}/{market}'
+    df can hold only the new or changed rows of a refresh, e.g. the delta
+    files of 'extract_manifest.json'
+
+    Expects df to have columns called 'market' and 'text' and 'pvid' as a
+    column or index
+
+    Args:
+        df (pd.DataFrame): rows to insert
+        index_dir (Path): directory of the market indexes
+        threshold (float): threshold to match on
+        rule (str, optional): rule choosing the row to keep per cluster.
+        Defaults to "longest_text".
+        shingling (str, optional): one of shingle_strategies. Defaults to "words".
+        recall (float, optional): target recall at threshold to tune LSH for.
+        Defaults to None.
+
+    Returns:
+        pd.DataFrame: rows whose cluster or keep flag changed, per market
+        pd.DataFrame: rows, new rows, rows with a changed text, rows whose
+        cluster or keep flag changed and seconds taken per market
+    """
+    df_markets_changes = []
+    timings = []
+
+    for market, df_market in df.groupby(
+        "market",
+        sort=False,
+        observed=True,
+    ):
+        start_time = time.perf_counter()
+
+        index = LSHIndex(
+            path=Path(index_dir, market),
+            threshold=threshold,
+            rule=rule,
+            shingling=shingling,
+            recall=recall,
+        )
+
+        n_rows = len(index.df_rows)
+        df_changes = index.update(df_market)
+        index.save()
+
+        df_markets_changes.append(df_changes.assign(market=market))
+
+        timings.append(
+            {
+                "market": market,
+                "rows": len(index.df_rows),
+                "rows_new": len(index.df_rows) - n_rows,
+                "rows_replaced": int(df_changes["is_changed"].sum()),
+                "rows_changed": len(df_changes),
+                "seconds": time.perf_counter() - start_time,
+            }
+        )
+
+    # Nothing to insert, e.g. no new rows this refresh
+    if not timings:
+        return pd.DataFrame(), pd.DataFrame()
+
+    df_changes = pd.concat(df_markets_changes)
+    df_timings = pd.DataFrame(timings).set_index("market")
+
+    return df_changes, df_timings
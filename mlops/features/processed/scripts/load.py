@@ -1,21 +1,59 @@
-from functools import lru_cache
 from pathlib import Path
 
 import pandas as pd
 
+from mlops.features.scripts.cache import dataset_cache
+from mlops.features.scripts.storage import read_dataset
 
-@lru_cache
-def read_raw_file(file_path: Path) -> pd.DataFrame:
+
+def read_raw_file(
+    file_path: Path,
+    columns: tuple[str] = None,
+) -> pd.DataFrame:
+    """Reads file as dataframe, cached until the file changes.
+
+    Each call returns its own copy so it can be modified safely
+
+    Args:
+        file_path (Path): file path
+        columns (tuple[str], optional): Parquet columns to read.
+        Defaults to None, all.
+
+    Returns:
+        pd.DataFrame: dataframe
+    """
+    return dataset_cache.read(
+        file_path,
+        load=load_raw_file,
+        columns=columns,
+    )
+
+
+def load_raw_file(
+    file_path: Path,
+    columns: tuple[str] = None,
+) -> pd.DataFrame:
     """Reads file as dataframe.
 
     A copy of 'text' already exists as 'text_orig' for reference
 
+    Parquet datasets are written already cleaned and indexed by pvid
+    so are read as they are
+
     Args:
         file_path (Path): file path
+        columns (tuple[str], optional): Parquet columns to read.
+        Defaults to None, all.
 
     Returns:
         pd.DataFrame: dataframe
     """
+    if file_path.suffix == ".parquet":
+        return read_dataset(
+            file_path,
+            columns=list(columns) if columns else None,
+        )
+
     df = (
         pd.read_csv(
             file_path,
@@ -0,0 +1,313 @@
+import hashlib
+import struct
+from functools import lru_cache
+
+import numpy as np
+from scipy.integrate import quad
+
+# Same constants as datasketch so signatures match datasketch.MinHash
+mersenne_prime = np.uint64((1 << 61) - 1)
+max_hash = np.uint64((1 << 32) - 1)
+
+
+@lru_cache(maxsize=1_000_000)
+def hash_token(token: str) -> int:
+    """Hashes a token to 32 bits using the first 4 bytes of its SHA1.
+
+    Same hash as datasketch.MinHash
+    Cached as the same tokens come up in many texts
+
+    Args:
+        token (str): token
+
+    Returns:
+        int: 32 bit hash
+    """
+    return struct.unpack("<I", hashlib.sha1(token.encode("utf8")).digest()[:4])[0]
+
+
+def get_permutations(
+    num_perm: int,
+    seed: int,
+) -> np.ndarray:
+    """Gets the (a, b) parameters of the random permutations.
+
+    Args:
+        num_perm (int): number of permutations
+        seed (int): random seed
+
+    Returns:
+        np.ndarray: (2, num_perm) array of a and b
+    """
+    gen = np.random.RandomState(seed)
+
+    return np.array(
+        [
+            (
+                gen.randint(1, mersenne_prime, dtype=np.uint64),
+                gen.randint(0, mersenne_prime, dtype=np.uint64),
+            )
+            for _ in range(num_perm)
+        ],
+        dtype=np.uint64,
+    ).T
+
+
+def compute_signatures(
+    shingles: list[np.ndarray],
+    num_perm: int = 128,
+    seed: int = 42,
+    max_block_shingles: int = 100_000,
+) -> np.ndarray:
+    """Computes MinHash signatures of all rows at once.
+
+    Rows are processed in blocks of up to max_block_shingles shingles,
+    permuted in place in one reused buffer of max_block_shingles * num_perm
+    uint64, about 100 MB by default, whatever the length of the texts
+    A row with more shingles than that is a block of its own
+
+    Args:
+        shingles (list[np.ndarray]): 32 bit shingle hashes per row
+        num_perm (int, optional): number of permutations. Defaults to 128.
+        seed (int, optional): random seed. Defaults to 42.
+        max_block_shingles (int, optional): max shingles per block.
+        Defaults to 100_000.
+
+    Returns:
+        np.ndarray: (n_rows, num_perm) uint64 signatures
+    """
+    a, b = get_permutations(num_perm, seed)
+
+    signatures = np.full((len(shingles), num_perm), max_hash, dtype=np.uint64)
+
+    lengths = np.array([len(hashes) for hashes in shingles], dtype=np.int64)
+    ends = np.cumsum(lengths)
+
+    # Large enough for the largest block, no larger than all shingles
+    n_shingles = int(lengths.sum())
+    buffer_size = min(n_shingles, max(max_block_shingles, lengths.max(initial=0)))
+    buffer = np.empty((buffer_size, num_perm), dtype=np.uint64)
+
+    start = 0
+
+    while start < len(shingles):
+        # Rows until the block is full, at least one row
+        block_start = ends[start] - lengths[start]
+        stop = np.searchsorted(ends, block_start + max_block_shingles, side="right")
+        stop = max(stop, start + 1)
+
+        # Rows without shingles keep the max hash
+        rows = start + np.flatnonzero(lengths[start:stop])
+        start = stop
+
+        if not len(rows):
+            continue
+
+        hashes = np.concatenate([shingles[row] for row in rows]).astype(np.uint64)
+        offsets = np.concatenate([[0], np.cumsum(lengths[rows])[:-1]])
+
+        # Overflow wraps around as in datasketch
+        permuted = buffer[: len(hashes)]
+
+        with np.errstate(over="ignore"):
+            np.multiply(hashes[:, None], a, out=permuted)
+            np.add(permuted, b, out=permuted)
+
+        np.remainder(permuted, mersenne_prime, out=permuted)
+        np.bitwise_and(permuted, max_hash, out=permuted)
+
+        signatures[rows] = np.minimum.reduceat(permuted, offsets, axis=0)
+
+    return signatures
+
+
+def get_error_rates(
+    threshold: float,
+    bands: int,
+    rows: int,
+) -> tuple[float, float]:
+    """Gets the false positive and false negative areas of LSH parameters.
+
+    The false positive area is the probability of pairs less similar than
+    threshold being candidates, integrated over their similarity
+    The false negative area is that of pairs at least as similar not being
+    candidates
+
+    Args:
+        threshold (float): Jaccard similarity threshold
+        bands (int): number of bands
+        rows (int): signature values per band
+
+    Returns:
+        tuple[float, float]: false positive and false negative areas
+    """
+    false_positive, _ = quad(
+        lambda s: 1 - (1 - s**rows) ** bands,
+        0.0,
+        threshold,
+    )
+
+    false_negative, _ = quad(
+        lambda s: (1 - s**rows) ** bands,
+        threshold,
+        1.0,
+    )
+
+    return false_positive, false_negative
+
+
+@lru_cache
+def get_optimal_params(
+    threshold: float,
+    num_perm: int,
+    false_positive_weight: float = 0.5,
+    false_negative_weight: float = 0.5,
+) -> tuple[int, int]:
+    """Gets the number of bands and rows per band minimizing the weighted error.
+
+    Same search as datasketch.MinHashLSH
+
+    Args:
+        threshold (float): Jaccard similarity threshold
+        num_perm (int): number of permutations
+        false_positive_weight (float, optional): Defaults to 0.5.
+        false_negative_weight (float, optional): Defaults to 0.5.
+
+    Returns:
+        tuple[int, int]: number of bands and rows per band
+    """
+    min_error = float("inf")
+    params = (0, 0)
+
+    for bands in range(1, num_perm + 1):
+        for rows in range(1, num_perm // bands + 1):
+            false_positive, false_negative = get_error_rates(threshold, bands, rows)
+
+            error = (
+                false_positive * false_positive_weight
+                + false_negative * false_negative_weight
+            )
+
+            if error < min_error:
+                min_error = error
+                params = (bands, rows)
+
+    return params
+
+
+@lru_cache
+def get_tuned_params(
+    threshold: float,
+    num_perm: int,
+    recall: float,
+) -> tuple[int, int]:
+    """Gets the number of bands and rows per band reaching a target recall.
+
+    Recall is the mean probability of pairs at least threshold similar being
+    candidates
+    Of the parameters reaching it, those with the fewest false positives
+    are returned, otherwise those of highest recall
+
+    Args:
+        threshold (float): Jaccard similarity threshold
+        num_perm (int): number of permutations
+        recall (float): target recall, e.g. 0.95
+
+    Returns:
+        tuple[int, int]: number of bands and rows per band
+    """
+    min_false_positive = float("inf")
+    max_recall = 0.0
+    params = params_max_recall = (0, 0)
+
+    for bands in range(1, num_perm + 1):
+        for rows in range(1, num_perm // bands + 1):
+            false_positive, false_negative = get_error_rates(threshold, bands, rows)
+            params_recall = 1 - false_negative / (1 - threshold)
+
+            if params_recall > max_recall:
+                max_recall = params_recall
+                params_max_recall = (bands, rows)
+
+            if params_recall >= recall and false_positive < min_false_positive:
+                min_false_positive = false_positive
+                params = (bands, rows)
+
+    if params == (0, 0):
+        return params_max_recall
+
+    return params
+
+
+def get_band_buckets(
+    signatures: np.ndarray,
+    bands: int,
+    rows: int,
+    seed: int = 42,
+) -> np.ndarray:
+    """Gets the bucket of each row in each band.
+
+    Rows with identical signature values within a band share a bucket
+    Buckets are 64 bit hashes of the band values, so buckets of rows hashed
+    in different runs can be compared
+
+    Args:
+        signatures (np.ndarray): (n_rows, num_perm) signatures
+        bands (int): number of bands
+        rows (int): signature values per band
+        seed (int, optional): random seed of the hash. Defaults to 42.
+
+    Returns:
+        np.ndarray: (n_rows, bands) uint64 bucket keys
+    """
+    gen = np.random.RandomState(seed)
+    multipliers = gen.randint(
+        1,
+        np.iinfo(np.int64).max,
+        size=rows,
+        dtype=np.uint64,
+    ) | np.uint64(1)
+
+    buckets = np.empty((len(signatures), bands), dtype=np.uint64)
+
+    # Overflow wraps around, a multiply-sum hash of the band values
+    with np.errstate(over="ignore"):
+        for band in range(bands):
+            band_values = signatures[:, band * rows : (band + 1) * rows]
+            buckets[:, band] = (band_values * multipliers).sum(axis=1, dtype=np.uint64)
+
+    return buckets
+
+
+def get_candidate_pairs(buckets: np.ndarray) -> np.ndarray:
+    """Gets pairs of rows sharing a bucket in any band.
+
+    Each bucket only links its consecutive members, so a bucket of n rows
+    gives n - 1 pairs, which is enough to find its connected component
+
+    Args:
+        buckets (np.ndarray): (n_rows, bands) bucket keys
+
+    Returns:
+        np.ndarray: (n_pairs, 2) unique row position pairs
+    """
+    pairs = []
+
+    for band in range(buckets.shape[1]):
+        order = np.argsort(buckets[:, band], kind="stable")
+        bucket_sorted = buckets[order, band]
+
+        # Link each row to the next row of the same bucket
+        same_bucket = bucket_sorted[1:] == bucket_sorted[:-1]
+
+        pairs.append(
+            np.stack(
+                [order[:-1][same_bucket], order[1:][same_bucket]],
+                axis=1,
+            )
+        )
+
+    pairs = np.concatenate(pairs) if pairs else np.empty((0, 2), dtype=np.int64)
+
+    # The same rows often share buckets in several bands
+    return np.unique(np.sort(pairs, axis=1), axis=0)
@@ -1,50 +1,129 @@
-import re
-from unicodedata import normalize
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
 
-import ftfy
 import numpy as np
 import pandas as pd
 
+from mlops.inference.code.scripts.preprocess import sanitize_texts
 
-def coarse_gtin_to_length(
-    gtin: str,
+logging.basicConfig(
+    level=logging.INFO,
+    format="[%(asctime)s] %(message)s",
+    datefmt="%d/%m/%y %H:%M:%S",
+)
+
+
+def normalize_gtin(
+    s: pd.Series,
     length: int = 13,
-) -> str:
-    """Coarse gtin to length.
+) -> pd.Series:
+    """Normalizes a column of GTINs to a length.
 
     GTIN length in the database is not always 13 digits
     The product library will usually fix this by padding or stripping a GTIN to 13
 
+    Shorter GTINs are padded with leading zeros
+    Longer GTINs keep only their last length digits
+
+    Args:
+        s (pd.Series): column of GTINs
+        length (int, optional): required GTIN length. Defaults to 13.
+
+    Returns:
+        pd.Series: normalized GTINs
+    """
+    return s.astype(str).str.zfill(length).str[-length:]
+
+
+def validate_gtin(s: pd.Series) -> pd.Series:
+    """Validates a column of GTINs of the same length by their GS1 check digit.
+
+    Args:
+        s (pd.Series): column of normalized GTINs
+
+    Returns:
+        pd.Series: True where a GTIN has only digits and a valid check digit
+    """
+    # Missing GTINs are invalid, whichever way astype(str) renders them
+    s = s.fillna("").astype(str)
+    valid = np.zeros(len(s), dtype=bool)
+
+    length = s.str.len().max() if not s.empty else 0
+
+    if length == 0:
+        return pd.Series(valid, index=s.index)
+
+    mask = s.str.fullmatch(rf"\d{{{length}}}").fillna(False).to_numpy(dtype=bool)
+
+    # One row of digits per GTIN
+    digits = np.frombuffer(
+        "".join(s[mask]).encode("ascii"),
+        dtype=np.uint8,
+    ).reshape(-1, length).astype(np.int64) - ord("0")
+
+    # Weights alternate 3, 1 from the digit left of the check digit
+    weights = np.where(np.arange(length - 1)[::-1] % 2 == 0, 3, 1)
+    check_digits = (10 - (digits[:, :-1] @ weights) % 10) % 10
+
+    valid[mask] = check_digits == digits[:, -1]
+
+    return pd.Series(valid, index=s.index)
+
+
+def sanitize_column(
+    s: pd.Series,
+    n_workers: int = 1,
+    chunk_size: int = 10_000,
+) -> list[str]:
+    """Sanitizes a column of texts, optionally across processes.
+
+    Chunks are sanitized in separate processes and returned in order
+
     Args:
-        gtin (str): gtin
-        length (int, optional): required gtin length. Defaults to 13.
+        s (pd.Series): column to sanitize
+        n_workers (int, optional): number of processes. Defaults to 1.
+        chunk_size (int, optional): rows per chunk sent to a process.
+        Defaults to 10_000.
 
     Returns:
-        str: _description_
+        list[str]: sanitized texts, in the same order as the column
     """
-    # Pad with leading zeros to length
-    if len(gtin) < length:
-        gtin = gtin.zfill(13)
+    start_time = time.perf_counter()
+
+    texts = s.to_list()
 
-    # Get only last length digits
-    elif len(gtin) > length:
-        gtin = gtin[-length:]
+    if n_workers > 1:
+        chunks = [texts[i : i + chunk_size] for i in range(0, len(texts), chunk_size)]
 
-    assert len(gtin) == 13, f"Warning, could not coarse to {length} digits"
+        # map() returns results in the order of the chunks
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            texts_sanitized = [
+                text for chunk in executor.map(sanitize_texts, chunks) for text in chunk
+            ]
 
-    return gtin
+    else:
+        texts_sanitized = sanitize_texts(texts)
+
+    rows_per_second = len(texts) / (time.perf_counter() - start_time)
+    logging.info(f"{s.name=}, {n_workers=}, {rows_per_second=:.0f}")
+
+    return texts_sanitized
 
 
 def sanitize(
     df: pd.DataFrame,
     cols: list[str],
+    n_workers: int = 1,
 ) -> pd.DataFrame:
     """Sanitizes data.
 
     Normalize decimal points
     Normalize unicode
-    Replace empty string "" with nan
     Remove leading, trailing, or 2+ spaces
+    Replace empty string "" with nan
+
+    Uses the same sanitization as inference
 
     Drop columns rows with any missing values
     Drop columns with duplicated values
@@ -52,25 +131,21 @@ def sanitize(
     Args:
         df (pd.DataFrame): dataframe
         cols (list[str]) : list of columns to sanitize
+        n_workers (int, optional): number of processes. Defaults to 1.
 
     Returns:
         pd.DataFrame: dataframe
     """
-    df[cols] = (
-        df[cols]
-        .map(normalise_decimal_point)
-        .map(normalize_unicode)
-        .map(str.strip)
-        .replace(
-            to_replace=r"\s+",
-            value=" ",
-            regex=False,
-        )
-        .replace(
-            to_replace="",
-            value=np.nan,
-            regex=False,
+    for col in cols:
+        df[col] = sanitize_column(
+            df[col],
+            n_workers=n_workers,
         )
+
+    df[cols] = df[cols].replace(
+        to_replace="",
+        value=np.nan,
+        regex=False,
     )
 
     # Convert float columns back to str
@@ -81,50 +156,3 @@ def sanitize(
     )
 
     return df
-
-
-def normalise_decimal_point(text: str) -> str:
-    """Normalises decimal points between digits.
-
-    Change text like '18,1' to '18.1'
-    This occurs in some EU markets
-
-    Args:
-        text (str): text
-
-    Returns:
-        str: normalised text
-    """
-    pattern = r"""
-        (\d+)  # One or more digits
-        (\,)   # Comma
-        ([\d]+)  # One or more digits
-        """
-
-    # Replace comma with decimal point
-    text = re.sub(
-        pattern,
-        lambda ele: ele[1] + "." + ele[3],
-        text,
-        flags=re.VERBOSE,
-    )
-
-    return text
-
-
-def normalize_unicode(text: str) -> str:
-    """Normalizes unicode.
-
-    Args:
-        text (str): text
-
-    Returns:
-        str: normalized text
-    """
-    # Fix broken Unicode and mojibake (encoding mix-ups)
-    text = ftfy.fix_text(text)
-
-    # Compatibility Decomposition, followed by Canonical Composition
-    text = normalize("NFKC", text)
-
-    return text
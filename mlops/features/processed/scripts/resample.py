@@ -1,35 +1,160 @@
+import numpy as np
 import pandas as pd
 
 
+def get_group_ranks(
+    codes: np.ndarray,
+    seed: int = 42,
+) -> np.ndarray:
+    """Gets a random rank of each row within its group.
+
+    One seeded permutation shuffles all rows, a stable sort by group then
+    keeps the shuffled order within each group
+    Taking rows ranked below n samples n rows per group without replacement
+
+    Args:
+        codes (np.ndarray): group code per row, e.g. from pd.factorize
+        seed (int, optional): random seed. Defaults to 42.
+
+    Returns:
+        np.ndarray: rank per row, from 0 within each group
+    """
+    permutation = np.random.default_rng(seed).permutation(len(codes))
+    order = permutation[np.argsort(codes[permutation], kind="stable")]
+
+    # Position of the first row of each row's group in the sorted rows
+    codes_sorted = codes[order]
+    group_starts = np.searchsorted(codes_sorted, codes_sorted)
+
+    ranks = np.empty(len(codes), dtype=np.int64)
+    ranks[order] = np.arange(len(codes)) - group_starts
+
+    return ranks
+
+
+def get_rarest_labels(s: pd.Series) -> np.ndarray:
+    """Gets the least frequent label of each row of a multi-label column.
+
+    Rows without labels are a group of their own
+
+    Args:
+        s (pd.Series): column of lists of labels
+
+    Returns:
+        np.ndarray: label code per row, ties broken by first appearance
+    """
+    # explode() gives one row per label, and one for an empty list
+    positions = np.repeat(
+        np.arange(len(s)),
+        np.maximum(s.map(len).to_numpy(), 1),
+    )
+
+    codes, _ = pd.factorize(
+        s.explode(),
+        use_na_sentinel=False,
+    )
+
+    frequency = np.bincount(codes)
+
+    # Sort each row's labels by frequency, keep the first label of each row
+    order = np.lexsort((codes, frequency[codes], positions))
+    positions_sorted = positions[order]
+    is_first = np.r_[True, positions_sorted[1:] != positions_sorted[:-1]]
+
+    return codes[order[is_first]]
+
+
+def sample_by_rank(
+    df: pd.DataFrame,
+    codes: np.ndarray,
+    count: int,
+    seed: int = 42,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Samples up to count rows per group without replacement.
+
+    Rows with a negative code, e.g. a missing label, are excluded
+
+    Args:
+        df (pd.DataFrame): dataframe to sample
+        codes (np.ndarray): group code per row
+        count (int): max number of rows per group
+        seed (int, optional): random seed. Defaults to 42.
+
+    Returns:
+        tuple[pd.DataFrame, pd.DataFrame]: sampled dataframe, excluded dataframe
+    """
+    is_sampled = (get_group_ranks(codes, seed=seed) < count) & (codes >= 0)
+
+    return df.iloc[np.flatnonzero(is_sampled)], df.iloc[np.flatnonzero(~is_sampled)]
+
+
 def downsample(
     df: pd.DataFrame,
+    seed: int = 42,
 ) -> pd.DataFrame:
     """Downsamples a dataframe to have equal number of labels.
 
     Args:
         df (pd.DataFrame): dataframe to downsample
+        seed (int, optional): random seed. Defaults to 42.
 
     Returns:
         pd.DataFrame: downsampled dataframe
     """
+    codes, _ = pd.factorize(df["label"])
+
     # Get the number of samples per label > get the min number of samples
-    min_label_count = min(df["label"].value_counts())
-
-    # resample by the the min number of samples
-    df = df.groupby(["label"]).apply(
-        lambda c: c.sample(
-            n=min_label_count,
-            replace=False,
-            random_state=42,
-        ),
-    )
+    min_label_count = np.bincount(codes[codes >= 0]).min()
 
-    # Drop level from Multi-Index
-    df.index = df.index.droplevel(0)
+    df, _ = sample_by_rank(
+        df,
+        codes=codes,
+        count=min_label_count,
+        seed=seed,
+    )
 
     return df
 
 
+def upsample(
+    df: pd.DataFrame,
+    count: int = None,
+    seed: int = 42,
+) -> pd.DataFrame:
+    """Upsamples a dataframe to have at least count samples per label.
+
+    Rows of a label are repeated in a random order, every row is used once
+    before any row is used again
+    Labels with more samples keep all of them
+
+    Args:
+        df (pd.DataFrame): dataframe to upsample
+        count (int, optional): min number of samples per label.
+        Defaults to None, the number of samples of the most frequent label.
+        seed (int, optional): random seed. Defaults to 42.
+
+    Returns:
+        pd.DataFrame: upsampled dataframe, with repeated index values
+    """
+    codes, _ = pd.factorize(df["label"])
+    positions = np.flatnonzero(codes >= 0)
+
+    label_counts = np.bincount(codes[positions])
+    targets = np.maximum(label_counts, count or label_counts.max())
+
+    # Rows sorted by label, then by their random rank within the label
+    ranks = get_group_ranks(codes, seed=seed)
+    order = positions[np.lexsort((ranks[positions], codes[positions]))]
+    label_starts = np.cumsum(label_counts) - label_counts
+
+    # The i-th sample of a label is its (i % label count)-th row
+    labels = np.repeat(np.arange(len(targets)), targets)
+    target_starts = np.cumsum(targets) - targets
+    samples = np.arange(targets.sum()) - np.repeat(target_starts, targets)
+
+    return df.iloc[order[label_starts[labels] + samples % label_counts[labels]]]
+
+
 def replace_labels(
     df: pd.DataFrame,
     to_replace: list[str],
@@ -56,51 +181,61 @@ def replace_labels(
 def sample_by_count(
     df: pd.DataFrame,
     count: int,
+    seed: int = 42,
 ) -> tuple[pd.DataFrame, pd.DataFrame]:
     """Samples a dataframe by given count.
 
+    Labels with more samples than count are sampled down to count
+    Labels with fewer samples keep all of them
+
     Args:
         df (pd.DataFrame): dataframe to sampled
         count (int): number of samples required
+        seed (int, optional): random seed. Defaults to 42.
 
     Returns:
         tuple[pd.DataFrame, pd.DataFrame]: sampled dataframe, excluded dataframe
     """
-    # Get labels with samples > count
-    # Keep only True
-    labels = df["label"].value_counts() > count
-    labels = labels[labels].index
-
-    # Resample samples with those labels by count
-    # Do not replace
-    df_higher = (
-        df.query("label in @labels")
-        .groupby(by="label")
-        .apply(
-            lambda c: c.sample(
-                n=count,
-                replace=False,
-                random_state=42,
-            )
-        )
+    codes, _ = pd.factorize(df["label"])
+
+    df_balanced, df_excluded = sample_by_rank(
+        df,
+        codes=codes,
+        count=count,
+        seed=seed,
     )
 
-    df_higher.index = df_higher.index.droplevel(0)
+    # Excluded samples are the rows not sampled, not rows of another text
+    df_excluded = df_excluded.dropna(subset=["text", "label"])
+
+    return df_balanced.reset_index(drop=True), df_excluded
 
-    # Get labels with samples <= count
-    # Keep only True
-    labels = df["label"].value_counts() <= count
-    labels = labels[labels].index
 
-    # Get samples with those labels
-    df_lower = df.query("label in @labels")
+def sample_multilabel_by_count(
+    df: pd.DataFrame,
+    count: int,
+    seed: int = 42,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Samples a multi-label dataframe by given count.
+
+    Each row is grouped by its least frequent label and groups are sampled
+    down to count, so rows with rare labels are kept whatever their other,
+    frequent labels
+    Rows without labels, the negative class, are sampled as one group
 
-    # Join dfs with balanced samples
-    df_balanced = pd.concat([df_higher, df_lower]).reset_index(drop=True)
+    Args:
+        df (pd.DataFrame): dataframe with a column of lists of labels
+        count (int): number of samples required per group
+        seed (int, optional): random seed. Defaults to 42.
 
-    # Get excluded samples
-    df_excluded = df[~df["text"].isin(df_balanced["text"])].dropna(
-        subset=["text", "label"]
+    Returns:
+        tuple[pd.DataFrame, pd.DataFrame]: sampled dataframe, excluded dataframe
+    """
+    df_balanced, df_excluded = sample_by_rank(
+        df,
+        codes=get_rarest_labels(df["label"]),
+        count=count,
+        seed=seed,
     )
 
-    return df_balanced, df_excluded
+    return df_balanced.reset_index(drop=True), df_excluded
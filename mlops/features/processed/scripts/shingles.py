@@ -0,0 +1,118 @@
+import re
+from functools import partial
+from typing import Callable
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from mlops.features.processed.scripts.minhash import hash_token
+
+WORD_PATTERN = re.compile(r"\w+")
+
+# Odd multipliers combining the hashes of the words or bytes of a shingle
+multipliers = np.random.RandomState(42).randint(
+    1,
+    np.iinfo(np.int64).max,
+    size=64,
+    dtype=np.uint64,
+) | np.uint64(1)
+
+
+def get_words(text: str) -> list[str]:
+    """Gets the lowercase words of a text, without punctuation.
+
+    Args:
+        text (str): text
+
+    Returns:
+        list[str]: words in order
+    """
+    return WORD_PATTERN.findall(text.lower())
+
+
+def combine_hashes(windows: np.ndarray) -> np.ndarray:
+    """Combines each window of hashes into one 32 bit hash.
+
+    Args:
+        windows (np.ndarray): (n_windows, size) hashes, size up to 64
+
+    Returns:
+        np.ndarray: uint32 hash per window
+    """
+    # Overflow wraps around, a multiply-sum hash of the window
+    with np.errstate(over="ignore"):
+        hashes = (windows.astype(np.uint64) * multipliers[: windows.shape[1]]).sum(
+            axis=1,
+            dtype=np.uint64,
+        )
+
+    # High bits are better mixed than low bits
+    return (hashes >> np.uint64(32)).astype(np.uint32)
+
+
+def shingle_words(
+    text: str,
+    n: int = 1,
+) -> np.ndarray:
+    """Gets the hashed word n-grams of a text.
+
+    Words are hashed as in datasketch.MinHash, so unigrams give the same
+    signatures as datasketch
+    A text of fewer than n words is one shingle
+
+    Args:
+        text (str): text
+        n (int, optional): words per shingle. Defaults to 1.
+
+    Returns:
+        np.ndarray: sorted unique uint32 shingle hashes
+    """
+    hashes = np.array(
+        [hash_token(word) for word in get_words(text)],
+        dtype=np.uint32,
+    )
+
+    if n > 1 and len(hashes) > 1:
+        hashes = combine_hashes(sliding_window_view(hashes, min(n, len(hashes))))
+
+    return np.unique(hashes)
+
+
+def shingle_chars(
+    text: str,
+    k: int = 5,
+) -> np.ndarray:
+    """Gets the hashed character k-grams of a text.
+
+    k-grams are taken over the UTF-8 bytes of the text with punctuation
+    removed and words separated by one space
+    A text of fewer than k bytes is one shingle
+
+    Args:
+        text (str): text
+        k (int, optional): bytes per shingle. Defaults to 5.
+
+    Returns:
+        np.ndarray: sorted unique uint32 shingle hashes
+    """
+    codes = np.frombuffer(
+        " ".join(get_words(text)).encode("utf8"),
+        dtype=np.uint8,
+    )
+
+    if not len(codes):
+        return np.empty(0, dtype=np.uint32)
+
+    return np.unique(combine_hashes(sliding_window_view(codes, min(k, len(codes)))))
+
+
+# Functions getting the hashed shingles of a text
+# Unigrams suit longer texts, n-grams and k-grams avoid matching short texts
+# which only share common words, e.g. ingredient lists
+shingle_strategies: dict[str, Callable[[str], np.ndarray]] = {
+    "words": shingle_words,
+    "word_bigrams": partial(shingle_words, n=2),
+    "word_trigrams": partial(shingle_words, n=3),
+    "chars_3": partial(shingle_chars, k=3),
+    "chars_5": partial(shingle_chars, k=5),
+}
@@ -1,134 +1,628 @@
-from collections import Counter
+import hashlib
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable
 
+import numpy as np
 import pandas as pd
-from datasketch import MinHash, MinHashLSH
 
+from mlops.features.processed.scripts.minhash import (
+    compute_signatures,
+    get_band_buckets,
+    get_candidate_pairs,
+    get_optimal_params,
+    get_tuned_params,
+)
+from mlops.features.processed.scripts.shingles import shingle_strategies
 
-def get_indices_to_keep(
-    indices: list[list[str]],
-) -> tuple[list[str], list[str]]:
-    """Gets a list of indices to keep.
+logging.basicConfig(
+    level=logging.INFO,
+    format="[%(asctime)s] %(message)s",
+    datefmt="%d/%m/%y %H:%M:%S",
+)
+
+num_perm = 128
+
+
+def get_shingles(
+    texts: list[str],
+    shingling: str = "words",
+) -> list[np.ndarray]:
+    """Gets the hashed shingles of texts.
+
+    Args:
+        texts (list[str]): texts
+        shingling (str, optional): one of shingle_strategies. Defaults to "words".
+
+    Returns:
+        list[np.ndarray]: sorted unique uint32 shingle hashes per text
+    """
+    shingle = shingle_strategies[shingling]
+
+    return [shingle(text) for text in texts]
+
+
+def get_lsh_params(
+    threshold: float,
+    recall: float = None,
+) -> tuple[int, int]:
+    """Gets the number of bands and rows per band of the LSH index.
+
+    Args:
+        threshold (float): threshold to match on
+        recall (float, optional): target recall at threshold. Defaults to None,
+        balancing false positives and negatives as datasketch.MinHashLSH.
+
+    Returns:
+        tuple[int, int]: number of bands and rows per band
+    """
+    if recall is None:
+        return get_optimal_params(
+            threshold=threshold,
+            num_perm=num_perm,
+        )
+
+    return get_tuned_params(
+        threshold=threshold,
+        num_perm=num_perm,
+        recall=recall,
+    )
+
+
+def collapse_exact_duplicates(
+    shingles: list[np.ndarray],
+) -> tuple[list[np.ndarray], np.ndarray]:
+    """Collapses texts with the same shingles.
+
+    Texts differing only in case, punctuation, whitespace or, for unigrams,
+    the order and repetition of words have the same shingles
+    Shingles are compared by their blake2b hash
+
+    Args:
+        shingles (list[np.ndarray]): sorted unique shingle hashes per text
+
+    Returns:
+        list[np.ndarray]: unique shingles, in order of first text
+        np.ndarray: position of the unique shingles of each text
+    """
+    hashes = np.array(
+        [
+            hashlib.blake2b(text_shingles.tobytes(), digest_size=8).digest()
+            for text_shingles in shingles
+        ],
+        dtype="S8",
+    )
+
+    _, first, inverse = np.unique(
+        hashes,
+        return_index=True,
+        return_inverse=True,
+    )
+
+    # Number unique shingles by their first text rather than their hash
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+
+    return [shingles[i] for i in first[order]], rank[inverse]
+
+
+def count_labels(label) -> int:
+    """Counts the labels of a row, a single label or a list of labels.
 
     Args:
-        indices (list[list[str]]): indices to process
+        label: label or list of labels
+
+    Returns:
+        int: number of labels
+    """
+    if isinstance(label, (list, tuple, set, np.ndarray)):
+        return len(label)
+
+    return int(pd.notna(label))
+
+
+def get_pvids(df: pd.DataFrame) -> pd.Series:
+    """Gets the pvid of each row as a number.
+
+    Loaded datasets have pvid as their index rather than a column
+    pvids are read as strings, compared as numbers "9" comes before "10"
+
+    Args:
+        df (pd.DataFrame): dataframe with a 'pvid' column or index
+
+    Returns:
+        pd.Series: numeric pvids, NaN where not a number
+    """
+    pvids = df["pvid"] if "pvid" in df.columns else df.index.to_series()
+
+    return pd.to_numeric(pvids, errors="coerce")
+
+
+# Sort key of each row within its cluster, the row with the lowest key is kept
+# Ties are broken by row position so the choice is deterministic
+representative_rules: dict[str, Callable[[pd.DataFrame], pd.Series]] = {
+    "longest_text": lambda df: -df["text"].str.len(),
+    "earliest_pvid": get_pvids,
+    "most_labels": lambda df: -df["label"].map(count_labels),
+}
+
+
+class DisjointSet:
+    """Union-find over row positions, with path halving and union by size."""
+
+    def __init__(
+        self,
+        n: int,
+        parent: list[int] = None,
+        size: list[int] = None,
+    ):
+        """Creates n singleton sets, or restores sets from their parents and sizes.
+
+        Args:
+            n (int): number of elements
+            parent (list[int], optional): parent per element. Defaults to None.
+            size (list[int], optional): set size per element. Defaults to None.
+        """
+        self.parent = list(range(n)) if parent is None else list(parent)
+        self.size = [1] * n if size is None else list(size)
+
+    def extend(self, n: int):
+        """Adds n singleton sets.
+
+        Args:
+            n (int): number of elements to add
+        """
+        self.parent.extend(range(len(self.parent), len(self.parent) + n))
+        self.size.extend([1] * n)
+
+    def reset(self, elements: list[int]):
+        """Makes elements singleton sets again.
+
+        Every element of their sets has to be reset, elements left out would
+        still point to them
+
+        Args:
+            elements (list[int]): elements to reset
+        """
+        for i in elements:
+            self.parent[i] = i
+            self.size[i] = 1
+
+    def find(self, i: int) -> int:
+        """Finds the root of the set of an element.
+
+        Args:
+            i (int): element
+
+        Returns:
+            int: root element
+        """
+        parent = self.parent
+
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+
+        return i
+
+    def union(
+        self,
+        i: int,
+        j: int,
+    ):
+        """Merges the sets of two elements.
+
+        Args:
+            i (int): element
+            j (int): element
+        """
+        root_i = self.find(i)
+        root_j = self.find(j)
+
+        if root_i == root_j:
+            return
+
+        if self.size[root_i] < self.size[root_j]:
+            root_i, root_j = root_j, root_i
+
+        self.parent[root_j] = root_i
+        self.size[root_i] += self.size[root_j]
+
+    def get_roots(self) -> np.ndarray:
+        """Gets the root of each element.
+
+        Returns:
+            np.ndarray: root element per element
+        """
+        return np.array(
+            [self.find(i) for i in range(len(self.parent))],
+            dtype=np.int64,
+        )
+
+    def get_components(self) -> np.ndarray:
+        """Gets the component id of each element.
 
-    Assuming we have 3 texts which are similar.
-    Their indices are: 3, 12, 9.
+        Ids are numbered in order of the first element of each component
 
-    Each of them will have a list of similar text indices such as:
-    Text with index 3 has these similar texts indices: [3, 12 , 9]
-    Text with index 12 has these similar texts indices: [12, 3, 9]
-    Text with index 9 has these similar texts indices: [9, 3, 12]
+        Returns:
+            np.ndarray: component id per element
+        """
+        _, first, inverse = np.unique(
+            self.get_roots(),
+            return_index=True,
+            return_inverse=True,
+        )
+
+        # Renumber components by their first element rather than their root
+        return np.argsort(np.argsort(first))[inverse]
 
-    The goal is to keep only 1 index.
 
-    Step 1 > make the 3 lists of indices unique > [3 ,9 , 12]
-    Step 2 > Sample 2 indices randomly to be removed > [9, 12]
+def get_clusters(
+    n_rows: int,
+    pairs: np.ndarray,
+) -> np.ndarray:
+    """Gets the connected components of rows linked by candidate pairs.
+
+    Args:
+        n_rows (int): number of rows
+        pairs (np.ndarray): (n_pairs, 2) row position pairs
 
     Returns:
-        tuple[list[str], list[str]]: indices to keep and removed
+        np.ndarray: cluster id per row
     """
-    # Apply set() to only keep unique tuples of indices
-    # convert from list of lists to list of tuples
-    # as set() only works on hashable types
-    indices_unique = set(map(tuple, indices))
+    disjoint_set = DisjointSet(n_rows)
 
-    indices_keep = []
+    for i, j in pairs.tolist():
+        disjoint_set.union(i, j)
 
-    # Count the frequency of each index to keep the most frequent
-    indices_unique_flat = [index for tup in indices_unique for index in tup]
-    frequency = Counter(indices_unique_flat)
+    return disjoint_set.get_components()
 
-    # Get the frequencies of the current indices tuple
-    for indices_unique_tup in indices_unique:
-        tup_frequency = {}
 
-        for index in indices_unique_tup:
-            tup_frequency[index] = frequency[index]
+def get_representatives(
+    cluster_ids: np.ndarray,
+    priorities: np.ndarray,
+) -> np.ndarray:
+    """Gets the row position of one representative per cluster.
 
-        # Get the index with the highest frequency to keep
-        index_max = max(tup_frequency, key=tup_frequency.get)
-        indices_keep.append(index_max)
+    Args:
+        cluster_ids (np.ndarray): cluster id per row
+        priorities (np.ndarray): sort key per row from representative_rules,
+        the row with the lowest key in a cluster is its representative
 
-    # Remove duplicated indices
-    # Do not sort to keep similar indices together
-    indices_keep_unique = list(set(indices_keep))
-    indices_remove_unique = list(set(indices_unique_flat) - set(indices_keep_unique))
+    Returns:
+        np.ndarray: sorted row positions to keep
+    """
+    df_rank = pd.DataFrame(
+        {
+            "cluster_id": cluster_ids,
+            "priority": priorities,
+            "position": np.arange(len(cluster_ids)),
+        }
+    )
 
-    return indices_keep_unique, indices_remove_unique
+    positions = (
+        df_rank.sort_values(["cluster_id", "priority", "position"])
+        .drop_duplicates("cluster_id")["position"]
+        .to_numpy()
+    )
+
+    return np.sort(positions)
 
 
 def filter_similar_text(
     df: pd.DataFrame,
     threshold: int,
+    rule: str = "longest_text",
+    shingling: str = "words",
+    recall: float = None,
 ) -> tuple[pd.DataFrame, pd.DataFrame]:
     """Filters similar values using MinHash LSH.
 
-    TODO: try Asynchronous?
+    Texts with the same shingles are exact duplicates, collapsed before LSH
+    Signatures of all remaining texts are computed at once into a
+    (n_rows, num_perm) matrix and LSH banding runs on that matrix
+    Rows sharing an LSH bucket are clustered with union-find
+    and one representative per cluster is kept
 
     Drops these values from the input dataframe
     Expects df to have a column called 'text'
-    Returns the original input dataframe for accuracy evaluation
+    Adds a 'cluster_id' column, unique within df, to audit removals
 
     Args:
         df (pd.DataFrame): Dataframe with similar values
         threshold (int): threshold to match on
+        rule (str, optional): rule choosing the row to keep per cluster,
+        one of representative_rules. Defaults to "longest_text".
+        shingling (str, optional): one of shingle_strategies. Defaults to "words".
+        recall (float, optional): target recall at threshold to tune LSH for.
+        Defaults to None.
 
     Returns:
         pd.DataFrame: Dataframe without similar values
-        pd.DataFrame: Input dataframe
+        pd.DataFrame: Removed similar values
     """
-    # Split each text on spaces >
-    # Remove duplicates using set >
-    # Encode each token and return a list
-    df["tokens"] = (
-        df["text"]
-        .apply(str.split)
-        .apply(set)
-        .apply(lambda tokens: [token.encode("utf8") for token in tokens])
+    # Only one text per set of shingles goes through LSH
+    shingles, inverse = collapse_exact_duplicates(
+        get_shingles(
+            texts=df["text"].to_list(),
+            shingling=shingling,
+        )
     )
 
-    # Create MinHash permutations for each set of tokens
-    df["mhs"] = [
-        MinHash(
-            num_perm=128,
-            seed=42,
-        )
-        for _ in range(len(df))
-    ]
+    logging.info(f"{len(df)=}, {len(shingles)=}")
 
-    # Update each mhs with tokens
-    df[["tokens", "mhs"]].apply(
-        lambda row: row["mhs"].update_batch(row["tokens"]),
-        axis=1,
+    signatures = compute_signatures(
+        shingles=shingles,
+        num_perm=num_perm,
+        seed=42,
     )
 
-    # Create LSH index
-    lsh = MinHashLSH(
+    bands, rows = get_lsh_params(
         threshold=threshold,
-        num_perm=128,
+        recall=recall,
     )
 
-    # Insert all mhs into LSH index
-    # Each mhs key in the LSH index is it's index (0, 1, 2, etc.)
-    # Use ind as keys of the LSH index
-    for ind, mh in enumerate(df["mhs"]):
-        lsh.insert(f"{ind}", mh)
+    # Bucket each row in each band of its signature
+    buckets = get_band_buckets(
+        signatures=signatures,
+        bands=bands,
+        rows=rows,
+    )
 
-    # Save each query similar keys
-    # This includes the query mh index itself
-    df["mhs_keys"] = df["mhs"].apply(lsh.query)
+    # Rows linked through any shared bucket form a cluster
+    # Texts with the same shingles join their cluster
+    cluster_ids = get_clusters(
+        n_rows=len(shingles),
+        pairs=get_candidate_pairs(buckets),
+    )[inverse]
 
-    # Get indices to keep and remove
-    indices_keep, indices_remove = get_indices_to_keep(df["mhs_keys"])
+    df = df.assign(cluster_id=cluster_ids)
 
-    # Convert indices to int
-    indices_keep = list(map(int, indices_keep))
-    indices_remove = list(map(int, indices_remove))
+    indices_keep = get_representatives(
+        cluster_ids=cluster_ids,
+        priorities=representative_rules[rule](df).to_numpy(),
+    )
 
-    df = df.drop(columns=["tokens", "mhs", "mhs_keys"])
+    is_keep = np.zeros(len(df), dtype=bool)
+    is_keep[indices_keep] = True
 
     df_keep = df.iloc[indices_keep]
-    df_remove = df.iloc[indices_remove]
+    df_remove = df.iloc[np.flatnonzero(~is_keep)]
 
     return df_keep, df_remove
+
+
+def filter_similar_text_market(
+    market: str,
+    df: pd.DataFrame,
+    threshold: float,
+    rule: str = "longest_text",
+    shingling: str = "words",
+    recall: float = None,
+) -> tuple[pd.DataFrame, pd.DataFrame, dict]:
+    """Filters similar values of one market and times it.
+
+    Args:
+        market (str): market code
+        df (pd.DataFrame): market dataframe
+        threshold (float): threshold to match on
+        rule (str, optional): rule choosing the row to keep per cluster.
+        Defaults to "longest_text".
+        shingling (str, optional): one of shingle_strategies. Defaults to "words".
+        recall (float, optional): target recall at threshold to tune LSH for.
+        Defaults to None.
+
+    Returns:
+        pd.DataFrame: Dataframe without similar values
+        pd.DataFrame: Removed similar values
+        dict: market, rows, rows kept and removed, seconds taken
+    """
+    start_time = time.perf_counter()
+
+    df_keep, df_remove = filter_similar_text(
+        df=df,
+        threshold=threshold,
+        rule=rule,
+        shingling=shingling,
+        recall=recall,
+    )
+
+    timing = {
+        "market": market,
+        "rows": len(df),
+        "rows_keep": len(df_keep),
+        "rows_remove": len(df_remove),
+        "seconds": time.perf_counter() - start_time,
+    }
+
+    return df_keep, df_remove, timing
+
+
+def filter_similar_text_by_market(
+    df: pd.DataFrame,
+    threshold: float,
+    rule: str = "longest_text",
+    shingling: str = "words",
+    recall: float = None,
+    n_workers: int = 1,
+) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Filters similar values within each market, markets in parallel processes.
+
+    Markets are independent so each is deduplicated in its own process
+    Largest markets are submitted first so they do not finish last
+    Results are concatenated in order of first appearance of each market,
+    whatever the order they finish in
+
+    Expects df to have columns called 'market' and 'text'
+
+    Args:
+        df (pd.DataFrame): dataframe with similar values
+        threshold (float): threshold to match on
+        rule (str, optional): rule choosing the row to keep per cluster.
+        Defaults to "longest_text".
+        shingling (str, optional): one of shingle_strategies. Defaults to "words".
+        recall (float, optional): target recall at threshold to tune LSH for.
+        Defaults to None.
+        n_workers (int, optional): number of processes. Defaults to 1.
+
+    Returns:
+        pd.DataFrame: Dataframe without similar values
+        pd.DataFrame: Removed similar values
+        pd.DataFrame: rows, rows kept and removed, seconds taken per market
+    """
+    df_markets = dict(
+        list(
+            df.groupby(
+                "market",
+                sort=False,
+                observed=True,
+            )
+        )
+    )
+
+    markets = list(df_markets)
+    markets_by_size = sorted(markets, key=lambda market: -len(df_markets[market]))
+
+    results = {}
+
+    if n_workers > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = {
+                executor.submit(
+                    filter_similar_text_market,
+                    market=market,
+                    df=df_markets[market],
+                    threshold=threshold,
+                    rule=rule,
+                    shingling=shingling,
+                    recall=recall,
+                ): market
+                for market in markets_by_size
+            }
+
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+
+    else:
+        for market in markets_by_size:
+            results[market] = filter_similar_text_market(
+                market=market,
+                df=df_markets[market],
+                threshold=threshold,
+                rule=rule,
+                shingling=shingling,
+                recall=recall,
+            )
+
+    df_keep, df_remove, timings = zip(*[results[market] for market in markets])
+    df_timings = pd.DataFrame(timings).set_index("market")
+
+    logging.info(f"{n_workers=}, {df_timings['seconds'].sum()=:.1f}")
+
+    return pd.concat(df_keep), pd.concat(df_remove), df_timings
+
+
+def benchmark_shingling(
+    df: pd.DataFrame,
+    threshold: float,
+    shinglings: list[str] = None,
+    recall: float = None,
+    sample_size: int = 10_000,
+) -> pd.DataFrame:
+    """Compares shingle strategies on a sample of texts.
+
+    Candidates of a row are the other rows sharing one of its buckets,
+    summed over bands, so rows sharing several buckets are counted again
+
+    Args:
+        df (pd.DataFrame): dataframe with a column called 'text'
+        threshold (float): threshold to match on
+        shinglings (list[str], optional): shingle strategies to compare.
+        Defaults to None, all of shingle_strategies.
+        recall (float, optional): target recall at threshold to tune LSH for.
+        Defaults to None.
+        sample_size (int, optional): rows sampled. Defaults to 10_000.
+
+    Returns:
+        pd.DataFrame: LSH parameters, candidate counts, clusters and seconds
+        taken per strategy
+    """
+    texts = (
+        df["text"]
+        .sample(
+            n=min(sample_size, len(df)),
+            random_state=42,
+        )
+        .to_list()
+    )
+
+    bands, rows = get_lsh_params(
+        threshold=threshold,
+        recall=recall,
+    )
+
+    results = []
+
+    for shingling in shinglings or list(shingle_strategies):
+        start_time = time.perf_counter()
+
+        shingles, inverse = collapse_exact_duplicates(
+            get_shingles(
+                texts=texts,
+                shingling=shingling,
+            )
+        )
+
+        shingle_time = time.perf_counter()
+
+        signatures = compute_signatures(
+            shingles=shingles,
+            num_perm=num_perm,
+            seed=42,
+        )
+
+        signature_time = time.perf_counter()
+
+        buckets = get_band_buckets(
+            signatures=signatures,
+            bands=bands,
+            rows=rows,
+        )
+
+        cluster_ids = get_clusters(
+            n_rows=len(shingles),
+            pairs=get_candidate_pairs(buckets),
+        )[inverse]
+
+        query_time = time.perf_counter()
+
+        candidates = np.zeros(len(shingles), dtype=np.int64)
+
+        for band in range(bands):
+            _, bucket_inverse, bucket_counts = np.unique(
+                buckets[:, band],
+                return_inverse=True,
+                return_counts=True,
+            )
+
+            candidates += bucket_counts[bucket_inverse] - 1
+
+        results.append(
+            {
+                "shingling": shingling,
+                "rows": len(texts),
+                "rows_unique": len(shingles),
+                "bands": bands,
+                "rows_per_band": rows,
+                "candidates_mean": candidates.mean() if len(shingles) else 0.0,
+                "candidates_max": candidates.max(initial=0),
+                "clusters": len(np.unique(cluster_ids)),
+                "shingle_seconds": shingle_time - start_time,
+                "signature_seconds": signature_time - shingle_time,
+                "query_seconds": query_time - signature_time,
+            }
+        )
+
+    return pd.DataFrame(results).set_index("shingling")
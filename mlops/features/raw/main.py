@@ -1,10 +1,12 @@
 # %%
+from datetime import date
 from pathlib import Path
 
 import pandas as pd
 
-from mlops.features.raw.scripts.extract import run
+from mlops.features.raw.scripts.incremental import read_json, run_markets_incremental
 from mlops.features.raw.scripts.load import read_raw_file
+from mlops.features.raw.scripts.memory import TranslationMemory
 from mlops.features.raw.scripts.preprocess import (
     get_market_id,
     map_markets,
@@ -13,44 +15,80 @@ from mlops.features.raw.scripts.preprocess import (
     markets_non_english,
 )
 from mlops.features.raw.scripts.translator import translate_market
+from mlops.features.scripts.storage import write_dataset
 
 # %%
+# Only rows changed since each market's last run are queried after the first run
 from_date = "2021-06-01"
-to_date = "2024-06-01"
+to_date = date.today().strftime("%Y-%m-%d")
 
-for market in markets:
-    # Query expects a market id not a code
-    market_id = get_market_id(market)
-    print(f"{market=}, {market_id=}")
+# Extract markets concurrently and merge new rows into each market file
+# Keep identifiers as strings so leading zeros are not lost
+# Query expects a market id not a code
+manifest = run_markets_incremental(
+    path=Path(
+        "mlops",
+        "features",
+        "raw",
+        "data",
+        "query.sql",
+    ),
+    output_dir=Path(
+        "mlops",
+        "features",
+        "raw",
+        "data",
+    ),
+    market_ids={market: get_market_id(market) for market in markets},
+    from_date=from_date,
+    to_date=to_date,
+    dtype={
+        "pvid": "string",
+        "gtin": "string",
+    },
+)
 
-    df = run(
-        path=Path(
-            "mlops",
-            "features",
-            "raw",
-            "data",
-            "query.sql",
-        ),
-        params={
-            "from_date": from_date,
-            "to_date": to_date,
-            "market_id": market_id,
-        },
+print(manifest)
+
+# %%
+# Markets of the last extract and their number of new or changed rows
+manifest = read_json(
+    Path(
+        "mlops",
+        "features",
+        "raw",
+        "data",
+        "extract_manifest.json",
     )
+)
 
-    df.to_csv(
-        Path(
-            "mlops",
-            "features",
-            "raw",
-            "data",
-            f"{market}.csv",
-        ),
-        index=False,
+# Shared by all markets and runs so a text is only ever translated once
+memory = TranslationMemory(
+    Path(
+        "mlops",
+        "features",
+        "raw",
+        "data",
+        "translations.sqlite",
     )
+)
 
-# %%
 for market in markets_non_english:
+    translated_path = Path(
+        "mlops",
+        "features",
+        "raw",
+        "data",
+        f"{market}_translated.parquet",
+    )
+
+    # Translations are still valid if the market file did not change
+    rows_delta = manifest.get(market, {}).get("rows_delta", 0)
+
+    if translated_path.exists() and rows_delta == 0:
+        print(f"{market=}, no new rows, skipping translation")
+        continue
+
     df = read_raw_file(
         Path(
             "mlops",
@@ -67,17 +105,23 @@ for market in markets_non_english:
     df["text"] = df["text"].str.replace(" | ", ". ", regex=False)
 
     # Original text will be copied to 'text_orig' column
-    df = translate_market(market, df)
-
-    df.to_csv(
-        Path(
+    # Translations are checkpointed so a failed run resumes where it stopped
+    df = translate_market(
+        market,
+        df,
+        checkpoint_path=Path(
             "mlops",
             "features",
             "raw",
             "data",
-            f"{market}_translated.csv",
+            f"{market}_translated.jsonl",
         ),
-        index=True,
+        memory=memory,
+    )
+
+    write_dataset(
+        df,
+        translated_path,
     )
 
 # %%
@@ -87,7 +131,7 @@ for market in markets:
     print(f"{market=}")
 
     if market in markets_non_english:
-        file_name = f"{market}_translated.csv"
+        file_name = f"{market}_translated.parquet"
 
     elif market in markets_english:
         file_name = f"{market}.csv"
@@ -113,15 +157,17 @@ for market in markets:
 
 df = pd.concat(dfs)
 
-df.to_csv(
+# Partition by market so stages can read only the markets they need
+write_dataset(
+    df,
     Path(
         "mlops",
         "features",
         "raw",
         "data",
-        "data.csv",
+        "data.parquet",
     ),
-    index=True,
+    partition_cols=["market"],
 )
 
 # %%
@@ -1,9 +1,20 @@
+import logging
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from pathlib import Path
 
 import pandas as pd
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, text
+from sqlalchemy import Engine, create_engine, text
+from tenacity import retry, stop_after_attempt, wait_exponential
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="[%(asctime)s] %(message)s",
+    datefmt="%d/%m/%y %H:%M:%S",
+)
 
 load_dotenv(".env")
 
@@ -14,15 +25,32 @@ host = "sql-dev-vm1.development.local"
 database = "MergedILabelServer_Daily"
 driver = "SQL Server"
 
+# One connection per market extracted concurrently
+pool_size = 4
+max_overflow = 0
 
-engine = create_engine(
-    f"mssql+pyodbc://"
-    f"{SQL_DEV_USERNAME}:"
-    f"{SQL_DEV_PASSWORD}@"
-    f"{host}/"
-    f"{database}?"
-    f"driver={driver}"
-)
+
+@lru_cache(maxsize=1)
+def get_engine() -> Engine:
+    """Gets the pooled engine of the development database.
+
+    Created on first use, so passing another engine, e.g. SQLite in tests,
+    does not need the SQL Server driver
+
+    Returns:
+        Engine: database engine
+    """
+    return create_engine(
+        f"mssql+pyodbc://"
+        f"{SQL_DEV_USERNAME}:"
+        f"{SQL_DEV_PASSWORD}@"
+        f"{host}/"
+        f"{database}?"
+        f"driver={driver}",
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_pre_ping=True,
+    )
 
 
 def run(
@@ -38,7 +66,7 @@ def run(
     Returns:
         pd.DataFrame: query output
     """
-    with engine.connect() as con:
+    with get_engine().connect() as con:
         with path.open("r") as f:
             df = pd.read_sql(
                 sql=text(f.read()),
@@ -47,3 +75,195 @@ def run(
             ).astype(str)
 
     return df
+
+
+def run_to_file(
+    path: Path,
+    output_path: Path,
+    params: dict = None,
+    chunksize: int = 50_000,
+    dtype: dict = None,
+    engine: Engine = None,
+) -> int:
+    """Runs a query with parameters and streams the output to a CSV file.
+
+    Rows are fetched and written in chunks so memory is bounded by chunksize
+    The file is written to a temporary path and renamed once complete,
+    the temporary file is removed if the query fails
+
+    Args:
+        path (Path): full query path
+        output_path (Path): CSV file path
+        params (dict, optional): query parameters. Defaults to None.
+        chunksize (int, optional): rows per chunk. Defaults to 50_000.
+        dtype (dict, optional): column types, e.g. {"gtin": "string"}.
+        Defaults to None, types inferred by pandas.
+        engine (Engine, optional): database engine. Defaults to get_engine().
+
+    Returns:
+        int: number of rows written
+    """
+    output_path_tmp = output_path.with_suffix(output_path.suffix + ".tmp")
+
+    engine = engine or get_engine()
+
+    n_rows = 0
+
+    try:
+        # Ask for a server side cursor where the driver supports it
+        with engine.connect().execution_options(stream_results=True) as con:
+            with path.open("r") as f:
+                result = con.execute(text(f.read()), params)
+
+            columns = list(result.keys())
+
+            # Write the header even if the query returns no rows
+            pd.DataFrame(columns=columns).to_csv(output_path_tmp, index=False)
+
+            while rows := result.fetchmany(chunksize):
+                df_chunk = pd.DataFrame(rows, columns=columns)
+
+                if dtype:
+                    df_chunk = df_chunk.astype(dtype)
+
+                df_chunk.to_csv(
+                    output_path_tmp,
+                    mode="a",
+                    header=False,
+                    index=False,
+                )
+
+                n_rows += len(df_chunk)
+                logging.info(f"{output_path.name=}, {n_rows=}")
+
+    except BaseException:
+        output_path_tmp.unlink(missing_ok=True)
+        raise
+
+    output_path_tmp.replace(output_path)
+
+    return n_rows
+
+
+@retry(
+    wait=wait_exponential(multiplier=5, max=60),
+    stop=stop_after_attempt(3),
+    reraise=True,
+)
+def run_market_to_file(
+    market: str,
+    path: Path,
+    output_dir: Path,
+    params: dict,
+    chunksize: int = 50_000,
+    dtype: dict = None,
+    engine: Engine = None,
+) -> dict:
+    """Extracts one market to '{market}.csv', retrying on failure.
+
+    Args:
+        market (str): market code
+        path (Path): full query path
+        output_dir (Path): output directory
+        params (dict): query parameters
+        chunksize (int, optional): rows per chunk. Defaults to 50_000.
+        dtype (dict, optional): column types. Defaults to None.
+        engine (Engine, optional): database engine. Defaults to get_engine().
+
+    Returns:
+        dict: market, rows and seconds taken
+    """
+    logging.info(f"Extracting {market=}...")
+
+    start_time = time.perf_counter()
+
+    n_rows = run_to_file(
+        path=path,
+        output_path=Path(output_dir, f"{market}.csv"),
+        params=params,
+        chunksize=chunksize,
+        dtype=dtype,
+        engine=engine,
+    )
+
+    seconds = time.perf_counter() - start_time
+    logging.info(f"Extracted {market=}, {n_rows=}, {seconds=:.1f}")
+
+    return {
+        "market": market,
+        "rows": n_rows,
+        "seconds": seconds,
+    }
+
+
+def run_markets_to_files(
+    path: Path,
+    output_dir: Path,
+    params: dict[str, dict],
+    max_workers: int = pool_size + max_overflow,
+    chunksize: int = 50_000,
+    dtype: dict = None,
+    engine: Engine = None,
+) -> pd.DataFrame:
+    """Extracts markets concurrently, one '{market}.csv' file per market.
+
+    Wall time approaches that of the slowest market
+    A market which still fails after retries does not stop the others
+
+    Args:
+        path (Path): full query path
+        output_dir (Path): output directory
+        params (dict[str, dict]): query parameters per market code
+        max_workers (int, optional): markets extracted at once, should not exceed
+        the engine pool. Defaults to pool_size + max_overflow.
+        chunksize (int, optional): rows per chunk. Defaults to 50_000.
+        dtype (dict, optional): column types. Defaults to None.
+        engine (Engine, optional): database engine. Defaults to get_engine().
+
+    Returns:
+        pd.DataFrame: rows, seconds taken and error per market
+    """
+    if not params:
+        return pd.DataFrame(
+            columns=["rows", "seconds"],
+            index=pd.Index([], name="market"),
+        )
+
+    engine = engine or get_engine()
+
+    timings = []
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(
+                run_market_to_file,
+                market=market,
+                path=path,
+                output_dir=output_dir,
+                params=market_params,
+                chunksize=chunksize,
+                dtype=dtype,
+                engine=engine,
+            ): market
+            for market, market_params in params.items()
+        }
+
+        for future in as_completed(futures):
+            market = futures[future]
+
+            try:
+                timings.append(future.result())
+
+            except Exception as error:
+                logging.error(f"Failed to extract {market=}: {error}")
+
+                timings.append(
+                    {
+                        "market": market,
+                        "error": str(error),
+                    }
+                )
+
+    df_timings = pd.DataFrame(timings).set_index("market").loc[list(params)]
+
+    return df_timings
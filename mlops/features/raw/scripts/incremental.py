@@ -0,0 +1,217 @@
+import json
+import logging
+from pathlib import Path
+
+import pandas as pd
+from sqlalchemy import Engine
+
+from mlops.features.raw.scripts.extract import run_markets_to_files
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="[%(asctime)s] %(message)s",
+    datefmt="%d/%m/%y %H:%M:%S",
+)
+
+
+def read_json(path: Path) -> dict:
+    """Reads a JSON file, or an empty dictionary if it does not exist.
+
+    Args:
+        path (Path): JSON file path
+
+    Returns:
+        dict: file content
+    """
+    if not path.exists():
+        return {}
+
+    with path.open("r") as f:
+        return json.load(f)
+
+
+def write_json(
+    path: Path,
+    content: dict,
+):
+    """Writes a JSON file to a temporary path and renames it once complete.
+
+    Args:
+        path (Path): JSON file path
+        content (dict): file content
+    """
+    path_tmp = path.with_suffix(path.suffix + ".tmp")
+
+    with path_tmp.open("w") as f:
+        json.dump(
+            content,
+            f,
+            indent=4,
+        )
+
+    path_tmp.replace(path)
+
+
+def merge_delta(
+    output_path: Path,
+    delta_path: Path,
+    chunksize: int = 50_000,
+) -> int:
+    """Merges new or changed rows into a market dataset.
+
+    Rows are deduplicated on pvid, keeping the delta version
+    The market dataset is streamed in chunks so memory is bounded by
+    chunksize and the size of the delta
+    The file is written to a temporary path and renamed once complete
+
+    Args:
+        output_path (Path): market CSV file path
+        delta_path (Path): delta CSV file path
+        chunksize (int, optional): rows per chunk. Defaults to 50_000.
+
+    Returns:
+        int: number of rows in the merged dataset
+    """
+    df_delta = pd.read_csv(
+        delta_path,
+        dtype=str,
+        keep_default_na=False,
+    ).drop_duplicates(
+        subset=["pvid"],
+        keep="last",
+    )
+
+    output_path_tmp = output_path.with_suffix(output_path.suffix + ".tmp")
+
+    if not output_path.exists():
+        df_delta.to_csv(output_path_tmp, index=False)
+        output_path_tmp.replace(output_path)
+
+        return len(df_delta)
+
+    columns = pd.read_csv(output_path, nrows=0).columns.to_list()
+    pvids_delta = set(df_delta["pvid"])
+
+    # Write the header even if the dataset has no rows
+    pd.DataFrame(columns=columns).to_csv(output_path_tmp, index=False)
+
+    n_rows = 0
+
+    with pd.read_csv(
+        output_path,
+        dtype=str,
+        keep_default_na=False,
+        chunksize=chunksize,
+    ) as reader:
+        for df_chunk in reader:
+            # Changed rows are written with the delta
+            df_chunk = df_chunk[~df_chunk["pvid"].isin(pvids_delta)]
+
+            df_chunk.to_csv(
+                output_path_tmp,
+                mode="a",
+                header=False,
+                index=False,
+            )
+
+            n_rows += len(df_chunk)
+
+    df_delta[columns].to_csv(
+        output_path_tmp,
+        mode="a",
+        header=False,
+        index=False,
+    )
+
+    output_path_tmp.replace(output_path)
+
+    return n_rows + len(df_delta)
+
+
+def run_markets_incremental(
+    path: Path,
+    output_dir: Path,
+    market_ids: dict[str, str],
+    from_date: str,
+    to_date: str,
+    dtype: dict = None,
+    engine: Engine = None,
+) -> dict:
+    """Extracts only rows added or changed since the last run of each market.
+
+    A per-market watermark, the to_date of its last successful run, is kept
+    in 'extract_state.json'. Each market is queried from its watermark,
+    or from_date on the first run, to to_date. The query must filter on the
+    date rows were last modified for changed rows to be picked up
+
+    New rows are saved to 'delta/{market}.csv' and merged into '{market}.csv'
+    'extract_manifest.json' lists the delta files of this run so downstream
+    stages can process only what changed, e.g. translation skips markets
+    without new rows
+
+    Args:
+        path (Path): full query path
+        output_dir (Path): output directory
+        market_ids (dict[str, str]): market id per market code
+        from_date (str): start date for markets without a watermark
+        to_date (str): end date, becomes the new watermark
+        dtype (dict, optional): column types. Defaults to None.
+        engine (Engine, optional): database engine. Defaults to get_engine().
+
+    Returns:
+        dict: delta manifest
+    """
+    state_path = Path(output_dir, "extract_state.json")
+    manifest_path = Path(output_dir, "extract_manifest.json")
+    delta_dir = Path(output_dir, "delta")
+    delta_dir.mkdir(exist_ok=True)
+
+    state = read_json(state_path)
+
+    params = {
+        market: {
+            "from_date": state.get(market, {}).get("watermark", from_date),
+            "to_date": to_date,
+            "market_id": market_id,
+        }
+        for market, market_id in market_ids.items()
+    }
+
+    df_timings = run_markets_to_files(
+        path=path,
+        output_dir=delta_dir,
+        params=params,
+        dtype=dtype,
+        engine=engine,
+    )
+
+    manifest = {}
+
+    for market, market_params in params.items():
+        # Keep the old watermark of failed markets so they are retried
+        if "error" in df_timings and pd.notna(df_timings.loc[market, "error"]):
+            continue
+
+        delta_path = Path(delta_dir, f"{market}.csv")
+
+        n_rows = merge_delta(
+            output_path=Path(output_dir, f"{market}.csv"),
+            delta_path=delta_path,
+        )
+
+        state[market] = {"watermark": to_date}
+
+        manifest[market] = {
+            "delta": str(delta_path),
+            "from_date": market_params["from_date"],
+            "to_date": to_date,
+            "rows_delta": int(df_timings.loc[market, "rows"]),
+            "rows": n_rows,
+        }
+
+        logging.info(f"{market=}, {manifest[market]=}")
+
+    write_json(state_path, state)
+    write_json(manifest_path, manifest)
+
+    return manifest
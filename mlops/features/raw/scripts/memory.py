@@ -0,0 +1,185 @@
+import argparse
+import hashlib
+import logging
+import sqlite3
+from pathlib import Path
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="[%(asctime)s] %(message)s",
+    datefmt="%d/%m/%y %H:%M:%S",
+)
+
+# SQLite default limit on variables in one query
+max_variables = 999
+
+
+def get_text_hash(text: str) -> str:
+    """Gets a hash of text with whitespace normalized.
+
+    Args:
+        text (str): text
+
+    Returns:
+        str: hex digest
+    """
+    text = " ".join(text.split())
+
+    return hashlib.blake2b(text.encode("utf8"), digest_size=16).hexdigest()
+
+
+class TranslationMemory:
+    """Translations stored by source language and text hash.
+
+    Shared across markets and runs so a text is only ever translated once
+    """
+
+    def __init__(self, path: Path):
+        """Opens or creates the translation memory.
+
+        Args:
+            path (Path): SQLite file path
+        """
+        self.path = path
+
+        self.con = sqlite3.connect(str(path))
+
+        with self.con:
+            self.con.execute("PRAGMA journal_mode=WAL")
+            self.con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS translations (
+                    from_language TEXT,
+                    text_hash TEXT,
+                    translation TEXT,
+                    PRIMARY KEY (from_language, text_hash)
+                )
+                """
+            )
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(
+        self,
+        texts: list[str],
+        from_language: str,
+    ) -> dict[str, str]:
+        """Gets stored translations.
+
+        Args:
+            texts (list[str]): texts to look up
+            from_language (str): language code of the texts
+
+        Returns:
+            dict[str, str]: text to translation, for texts found
+        """
+        hashes = [get_text_hash(text) for text in texts]
+        hashes_unique = list(set(hashes))
+
+        translations = {}
+
+        for i in range(0, len(hashes_unique), max_variables - 1):
+            hashes_chunk = hashes_unique[i : i + max_variables - 1]
+            placeholders = ", ".join("?" * len(hashes_chunk))
+
+            rows = self.con.execute(
+                f"""
+                SELECT text_hash, translation FROM translations
+                WHERE from_language = ? AND text_hash IN ({placeholders})
+                """,
+                [from_language, *hashes_chunk],
+            )
+
+            translations.update(rows.fetchall())
+
+        self.hits += len(translations)
+        self.misses += len(hashes_unique) - len(translations)
+
+        # Texts differing only in whitespace share a translation
+        return {
+            text: translations[text_hash]
+            for text, text_hash in zip(texts, hashes)
+            if text_hash in translations
+        }
+
+    def put(
+        self,
+        texts: list[str],
+        translations: list[str],
+        from_language: str,
+    ):
+        """Stores translations.
+
+        Args:
+            texts (list[str]): source texts
+            translations (list[str]): translations, None values are skipped
+            from_language (str): language code of the texts
+        """
+        with self.con:
+            self.con.executemany(
+                """
+                INSERT OR REPLACE INTO translations
+                (from_language, text_hash, translation) VALUES (?, ?, ?)
+                """,
+                [
+                    (from_language, get_text_hash(text), translation)
+                    for text, translation in zip(texts, translations)
+                    if translation is not None
+                ],
+            )
+
+    def stats(self) -> dict:
+        """Gets translation counts per language and hit/miss counters.
+
+        Returns:
+            dict: memory statistics
+        """
+        rows = self.con.execute(
+            """
+            SELECT from_language, COUNT(*) FROM translations
+            GROUP BY from_language
+            """
+        )
+
+        return {
+            "translations": dict(rows.fetchall()),
+            "bytes": self.path.stat().st_size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def compact(self):
+        """Reclaims unused space and refreshes query statistics."""
+        with self.con:
+            self.con.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+        self.con.execute("VACUUM")
+        self.con.execute("ANALYZE")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "command",
+        choices=["stats", "compact"],
+    )
+
+    parser.add_argument(
+        "-mp",
+        "--memory_path",
+        type=str,
+        required=True,
+    )
+
+    args = parser.parse_args()
+
+    memory = TranslationMemory(Path(args.memory_path))
+
+    if args.command == "compact":
+        size_before = memory.path.stat().st_size
+        memory.compact()
+        logging.info(f"{size_before=}, {memory.path.stat().st_size=}")
+
+    logging.info(f"{memory.stats()=}")
@@ -0,0 +1,137 @@
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """Token bucket refilled at a constant rate up to a capacity.
+
+    Tokens are reserved up front and may go negative, callers then wait
+    for the returned delay instead of holding a lock while sleeping
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float,
+    ):
+        """Creates a full bucket.
+
+        Args:
+            rate (float): tokens added per second
+            capacity (float): max tokens the bucket holds
+        """
+        self.rate = rate
+        self.capacity = capacity
+
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def reserve(
+        self,
+        amount: float,
+        now: float,
+    ) -> float:
+        """Takes tokens from the bucket.
+
+        Args:
+            amount (float): tokens to take
+            now (float): current monotonic time
+
+        Returns:
+            float: seconds to wait before the tokens are available
+        """
+        self.tokens = min(
+            self.capacity,
+            self.tokens + (now - self.updated) * self.rate,
+        )
+        self.updated = now
+
+        self.tokens -= amount
+
+        return max(0.0, -self.tokens / self.rate)
+
+
+class RateLimiter:
+    """Limits requests and characters sent per minute.
+
+    One instance is shared by all threads and tasks posting to the same
+    subscription. Waits are spread so throughput sits at the quota
+    """
+
+    def __init__(
+        self,
+        characters_per_minute: int,
+        requests_per_minute: int,
+    ):
+        """Creates a rate limiter.
+
+        Args:
+            characters_per_minute (int): characters allowed per minute
+            requests_per_minute (int): requests allowed per minute
+        """
+        self.characters = TokenBucket(
+            rate=characters_per_minute / 60,
+            capacity=characters_per_minute,
+        )
+
+        self.requests = TokenBucket(
+            rate=requests_per_minute / 60,
+            capacity=requests_per_minute,
+        )
+
+        self.paused_until = 0.0
+
+        self._lock = threading.Lock()
+
+    def reserve(self, characters: int) -> float:
+        """Reserves one request with a number of characters.
+
+        Args:
+            characters (int): characters in the request
+
+        Returns:
+            float: seconds to wait before sending the request
+        """
+        with self._lock:
+            now = time.monotonic()
+
+            return max(
+                self.characters.reserve(characters, now),
+                self.requests.reserve(1, now),
+                self.paused_until - now,
+            )
+
+    def wait(self, characters: int):
+        """Blocks until a request with a number of characters can be sent.
+
+        Args:
+            characters (int): characters in the request
+        """
+        delay = self.reserve(characters)
+
+        if delay > 0:
+            time.sleep(delay)
+
+    async def wait_async(self, characters: int):
+        """Waits, without blocking the event loop, until a request can be sent.
+
+        Args:
+            characters (int): characters in the request
+        """
+        delay = self.reserve(characters)
+
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds: float):
+        """Holds back all requests, e.g. for a 429 Retry-After.
+
+        Args:
+            seconds (float): seconds to wait before sending any request
+        """
+        with self._lock:
+            self.paused_until = max(
+                self.paused_until,
+                time.monotonic() + seconds,
+            )
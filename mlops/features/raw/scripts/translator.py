@@ -1,5 +1,6 @@
 import argparse
 import asyncio
+import json
 import logging
 import os
 import time
@@ -7,10 +8,15 @@ import uuid
 from pathlib import Path
 from typing import Union
 
+import httpx
 import pandas as pd
 import requests
 from dotenv import load_dotenv
 
+from mlops.features.raw.scripts.memory import TranslationMemory
+from mlops.features.raw.scripts.ratelimit import RateLimiter
+from mlops.features.scripts.storage import write_dataset
+
 logging.basicConfig(
     level=logging.INFO,
     format="[%(asctime)s] %(message)s",
@@ -22,13 +28,44 @@ load_dotenv(".env")
 TRANSLATOR_API_KEY = os.getenv("TRANSLATOR_API_KEY_DEV")
 endpoint = r"https://api.cognitive.microsofttranslator.com"
 
+# httpx rejects None header values, requests dropped them
 headers = {
-    "Ocp-Apim-Subscription-Key": TRANSLATOR_API_KEY,
-    "Ocp-Apim-Subscription-Region": "northeurope",
-    "Content-type": "application/json",
-    "X-ClientTraceId": str(uuid.uuid4()),
+    key: value
+    for key, value in {
+        "Ocp-Apim-Subscription-Key": TRANSLATOR_API_KEY,
+        "Ocp-Apim-Subscription-Region": "northeurope",
+        "Content-type": "application/json",
+        "X-ClientTraceId": str(uuid.uuid4()),
+    }.items()
+    if value is not None
 }
 
+# Characters are charged and limited on the source text
+# S1 allows 40 million characters per hour
+TRANSLATOR_CHARACTERS_PER_MINUTE = int(
+    os.getenv("TRANSLATOR_CHARACTERS_PER_MINUTE", 40_000_000 // 60)
+)
+TRANSLATOR_REQUESTS_PER_MINUTE = int(os.getenv("TRANSLATOR_REQUESTS_PER_MINUTE", 600))
+
+# Each translate request is limited to 50,000 characters, including translation,
+# and 1,000 texts
+max_characters = 25_000
+max_texts = 1_000
+
+# Max attempts for requests rejected with 429 or failing transiently,
+# e.g. timeouts and 5xx, which are retried after an exponential backoff
+max_attempts = 5
+max_backoff = 30
+
+# The API rejects the texts themselves, retrying them unchanged fails again
+rejected_status_codes = {400, 413}
+
+# Shared by all requests, sync or async, posted from this process
+rate_limiter = RateLimiter(
+    characters_per_minute=TRANSLATOR_CHARACTERS_PER_MINUTE,
+    requests_per_minute=TRANSLATOR_REQUESTS_PER_MINUTE,
+)
+
 # Map existing language codes to expected Azure Translator language codes
 # FIXME: 'BE' has multiple languages, french and dutch
 # IT's best to use a product's language_code instead of market_code
@@ -44,14 +81,115 @@ translator_language_codes = {
 }
 
 
+def pack_texts(
+    texts: list[str],
+    max_characters: int = max_characters,
+    max_texts: int = max_texts,
+) -> list[list[int]]:
+    """Packs texts into requests up to a character and text budget.
+
+    Texts are sorted by length so each request is filled with texts of
+    similar length. A text longer than the budget is sent on its own
+
+    Args:
+        texts (list[str]): texts to pack
+        max_characters (int, optional): max characters per request.
+        Defaults to max_characters.
+        max_texts (int, optional): max texts per request. Defaults to max_texts.
+
+    Returns:
+        list[list[int]]: positions of the texts in each request
+    """
+    positions = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+
+    chunks = []
+    chunk = []
+    chunk_characters = 0
+
+    for i in positions:
+        characters = len(texts[i])
+
+        if chunk and (
+            chunk_characters + characters > max_characters or len(chunk) == max_texts
+        ):
+            chunks.append(chunk)
+            chunk = []
+            chunk_characters = 0
+
+        if characters > max_characters:
+            logging.warning(f"Text at {i=} has {characters=} over {max_characters=}")
+
+        chunk.append(i)
+        chunk_characters += characters
+
+    if chunk:
+        chunks.append(chunk)
+
+    n_requests = len(chunks)
+    characters_per_request = sum(map(len, texts)) / max(n_requests, 1)
+    logging.info(f"{len(texts)=}, {n_requests=}, {characters_per_request=:.0f}")
+
+    return chunks
+
+
+class TranslationError(Exception):
+    """Raised when a translate request fails.
+
+    Args:
+        message (str): error message
+        status_code (int, optional): response status code, None without a
+        response. Defaults to None.
+    """
+
+    def __init__(self, message: str, status_code: int = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+    @property
+    def is_rejected(self) -> bool:
+        """True if the API rejected the texts, not a transient failure."""
+        return self.status_code in rejected_status_codes
+
+
+def get_backoff(attempt: int) -> float:
+    """Gets seconds to wait before retrying a transient failure.
+
+    Args:
+        attempt (int): failed attempt, from 0
+
+    Returns:
+        float: seconds to wait, doubling with each attempt up to max_backoff
+    """
+    return min(2.0**attempt, max_backoff)
+
+
+def get_retry_after(headers: dict) -> float:
+    """Gets seconds to wait from a 429 response.
+
+    Args:
+        headers (dict): response headers
+
+    Returns:
+        float: seconds to wait, 1 second if the header is missing
+    """
+    try:
+        return float(headers.get("Retry-After", 1))
+
+    except ValueError:
+        return 1.0
+
+
 def translate(
     texts: list[str],
     timeout: float,
     from_language: str = None,
     to_language: str = "en",
-) -> Union[list[dict], None]:
+) -> list[dict]:
     """Translates texts using Azure Translator API.
 
+    Requests rejected with 429 or failing transiently are retried up to
+    max_attempts times
+
     Args:
         texts (list): a list of texts to translate
         timeout (float): request timeout
@@ -59,7 +197,7 @@ def translate(
         to_language (str): language code to translate to. Defaults to "en".
 
     Returns:
-        Union[list[dict], None]: list of translation dictionaries:
+        list[dict]: list of translation dictionaries:
 
         {
             "translations": [
@@ -70,7 +208,8 @@ def translate(
             ],
         }
 
-        or None if an error is raised
+    Raises:
+        TranslationError: if the request failed, with its status code
     """
     # API expects a list of dictionaries, one for each text
     body = [{"text": text} for text in texts]
@@ -83,93 +222,305 @@ def translate(
         "to": to_language,
     }
 
+    characters = sum(len(text) for text in texts)
+
+    for attempt in range(max_attempts):
+        rate_limiter.wait(characters)
+
+        try:
+            response = requests.post(
+                endpoint + "/translate",
+                params=params,
+                headers=headers,
+                json=body,
+                timeout=timeout,
+            )
+
+        except requests.exceptions.Timeout:
+            error = TranslationError(f"TimeoutError after {timeout}")
+
+        except requests.exceptions.ConnectionError as e:
+            error = TranslationError(f"ConnectionError: {e}")
+
+        else:
+            # Hold back every request until the quota is available again
+            if response.status_code == 429:
+                retry_after = get_retry_after(response.headers)
+                logging.warning(f"Rate limited, retrying after {retry_after=}")
+                rate_limiter.pause(retry_after)
+                error = TranslationError("Rate limited", status_code=429)
+                continue
+
+            if response.status_code < 500:
+                break
+
+            error = TranslationError(
+                f"Server error {response.status_code}",
+                status_code=response.status_code,
+            )
+
+        # No wait after the last attempt
+        if attempt + 1 < max_attempts:
+            backoff = get_backoff(attempt)
+            logging.warning(f"{error}, retrying after {backoff=}")
+            time.sleep(backoff)
+
+    else:
+        logging.error(f"{error} after {max_attempts=}")
+        raise error
+
+    try:
+        response.raise_for_status()
+
+    except requests.exceptions.HTTPError as e:
+        raise TranslationError(
+            f"HTTPError: {e}",
+            status_code=response.status_code,
+        ) from e
+
+    try:
+        return response.json()
+
+    except ValueError as e:
+        raise TranslationError(f"Invalid response: {e}") from e
+
+
+def read_checkpoint(checkpoint_path: Path) -> dict[str, dict]:
+    """Reads translations saved by previous runs.
+
+    A partially written last line, e.g. after a crash, is skipped
+
+    Args:
+        checkpoint_path (Path): JSON lines checkpoint file
+
+    Returns:
+        dict[str, dict]: pvid to {"text_orig": str, "text": str}
+    """
+    translated = {}
+
+    if not checkpoint_path.exists():
+        return translated
+
+    with checkpoint_path.open("r", encoding="utf8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+
+            except json.JSONDecodeError:
+                logging.warning(f"Skipping corrupt checkpoint line {line=}")
+                continue
+
+            translated[record["pvid"]] = record
+
+    return translated
+
+
+def append_checkpoint(
+    checkpoint_path: Path,
+    records: list[dict],
+):
+    """Appends translations to the checkpoint file.
+
+    Args:
+        checkpoint_path (Path): JSON lines checkpoint file
+        records (list[dict]): {"pvid": str, "text_orig": str, "text": str}
+    """
+    with checkpoint_path.open("a", encoding="utf8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def translate_chunk(
+    texts: list[str],
+    from_language: str,
+) -> list[Union[str, None]]:
+    """Translates a chunk of texts, bisecting it when texts are rejected.
+
+    A chunk rejected by the API is split in two and each half is retried,
+    until the texts which can not be translated are isolated
+    A chunk failing otherwise, e.g. timing out, is left untranslated, so a
+    checkpointed run translates it again when restarted
+
+    Args:
+        texts (list[str]): texts to translate
+        from_language (str): language code to translate from
+
+    Returns:
+        list[Union[str, None]]: translations, None for texts which failed
+    """
     try:
-        response = requests.post(
-            endpoint + "/translate",
-            params=params,
-            headers=headers,
-            json=body,
-            timeout=timeout,
+        response = translate(
+            texts=texts,
+            timeout=20,
+            from_language=from_language,
+            to_language="en",
         )
 
-    except requests.exceptions.Timeout:
-        logging.error(f"TimeoutError after {timeout}")
-        return None
+    except TranslationError as e:
+        if not e.is_rejected:
+            logging.error(f"Could not translate chunk of {len(texts)=}, {e}")
+            return [None] * len(texts)
+
+        if len(texts) == 1:
+            logging.error(f"Could not translate {texts=}, {e}")
+            return [None]
 
     else:
-        try:
-            response.raise_for_status()
+        if len(response) == len(texts):
+            return [r["translations"][0]["text"] for r in response]
 
-        except requests.exceptions.HTTPError as e:
-            logging.error(f"HTTPError: {e}")
-            return None
+        logging.error(f"Got {len(response)=} translations for {len(texts)=}")
+        return [None] * len(texts)
 
-        else:
-            response = response.json()
-            return response
+    middle = len(texts) // 2
+
+    translations_left = translate_chunk(texts[:middle], from_language)
+    translations_right = translate_chunk(texts[middle:], from_language)
+
+    return translations_left + translations_right
 
 
 def translate_market(
     market: str,
     df: pd.DataFrame,
+    max_characters: int = max_characters,
+    checkpoint_path: Path = None,
+    memory: TranslationMemory = None,
 ) -> pd.DataFrame:
     """Translates a market texts into English.
 
-    Expects a 'text' column
+    Expects a 'text' column and a 'pvid' index
     Translation results are saved into new columns
 
+    With a checkpoint, each translated chunk is appended to the file as it
+    completes and rows already in the file are not translated again,
+    so a failed run can be restarted where it stopped
+
+    With a translation memory, texts translated before in any market or run
+    are not sent again and new translations are added to it
+
+    Rows which could not be translated are left as NaN
+
     Args:
         market (str): market code
         df (pd.DataFrame): dataframe
+        max_characters (int, optional): max characters per request.
+        Defaults to max_characters.
+        checkpoint_path (Path, optional): JSON lines checkpoint file.
+        Defaults to None.
+        memory (TranslationMemory, optional): translation memory.
+        Defaults to None.
 
     Returns:
         pd.DataFrame: dataframe with translated text
     """
-    # Each translate request is limited to 50,000 characters, including translation
-    # Split the text column into chunks of 200
-    n = 200
-    df_chunks = [df[i : i + n] for i in range(0, len(df), n)]
+    texts = df["text"].tolist()
+    pvids = df.index.astype(str).tolist()
 
-    text_translated_chunks = []
+    translated = read_checkpoint(checkpoint_path) if checkpoint_path else {}
 
-    for df_chunk in df_chunks:
-        response = translate(
-            texts=df_chunk["text"].tolist(),
-            timeout=20,
-            from_language=translator_language_codes[market],
-            to_language="en",
+    # Only keep checkpoint translations made from the same text
+    translated = {
+        pvid: translated[pvid]["text"]
+        for pvid, text in zip(pvids, texts)
+        if pvid in translated and translated[pvid]["text_orig"] == text
+    }
+
+    from_language = translator_language_codes[market]
+
+    positions = [i for i, pvid in enumerate(pvids) if pvid not in translated]
+
+    if memory is not None:
+        translations_memory = memory.get(
+            [texts[i] for i in positions],
+            from_language=from_language,
+        )
+
+        translated.update(
+            {
+                pvids[i]: translations_memory[texts[i]]
+                for i in positions
+                if texts[i] in translations_memory
+            }
+        )
+
+        positions = [i for i in positions if pvids[i] not in translated]
+        logging.info(f"{memory.stats()=}")
+
+    logging.info(f"{market=}, {len(translated)=}, {len(positions)=}")
+
+    chunks = pack_texts(
+        [texts[i] for i in positions],
+        max_characters=max_characters,
+    )
+
+    for chunk in chunks:
+        chunk_positions = [positions[i] for i in chunk]
+
+        translations = translate_chunk(
+            texts=[texts[i] for i in chunk_positions],
+            from_language=from_language,
         )
 
-        assert len(response) == len(df_chunk), "Missing translation responses"
-        text_translated_chunk = [r["translations"][0]["text"] for r in response]
-        text_translated_chunks.extend(text_translated_chunk)
+        if memory is not None:
+            memory.put(
+                [texts[i] for i in chunk_positions],
+                translations,
+                from_language=from_language,
+            )
+
+        records = [
+            {
+                "pvid": pvids[i],
+                "text_orig": texts[i],
+                "text": translation,
+            }
+            for i, translation in zip(chunk_positions, translations)
+            if translation is not None
+        ]
 
-        # Sleep to avoid rate limiting
-        time.sleep(2)
+        translated.update({record["pvid"]: record["text"] for record in records})
+
+        if checkpoint_path:
+            append_checkpoint(checkpoint_path, records)
+
+    n_failed = len(pvids) - len(translated)
+
+    if n_failed:
+        logging.error(f"{market=}, {n_failed=} rows could not be translated")
 
     # Copy text to a new column before overwriting for reference
     df["text_orig"] = df["text"]
-    df["text"] = text_translated_chunks
+    df["text"] = [translated.get(pvid) for pvid in pvids]
 
     return df
 
 
 async def translate_async(
+    client: httpx.AsyncClient,
+    semaphore: asyncio.Semaphore,
     texts: list[str],
     timeout: float,
     from_language: str = None,
     to_language: str = "en",
-) -> Union[list[dict], None]:
-    """Translates texts using Azure Translator API.
+) -> list[dict]:
+    """Translates texts using Azure Translator API without blocking the event loop.
+
+    Retried as translate()
 
     Args:
+        client (httpx.AsyncClient): shared async client
+        semaphore (asyncio.Semaphore): limits the number of concurrent requests
         texts (list): a list of texts to translate
         timeout (float): request timeout
         from_language (str): language code to translate from. Defaults to None.
         to_language (str): language code to translate to. Defaults to "en".
 
     Returns:
-        Union[list[dict], None]: list of translation dictionaries:
+        list[dict]: list of translation dictionaries:
 
         {
             "translations": [
@@ -180,94 +531,242 @@ async def translate_async(
             ],
         }
 
-        or None if an error is raised
+    Raises:
+        TranslationError: if the request failed, with its status code
     """
     # API expects a list of dictionaries, one for each text
     body = [{"text": text} for text in texts]
 
-    logging.info("Posting translation request...")
-
     params = {
         "api-version": "3.0",
         "from": from_language,
         "to": to_language,
     }
 
+    characters = sum(len(text) for text in texts)
+
+    async with semaphore:
+        for attempt in range(max_attempts):
+            await rate_limiter.wait_async(characters)
+
+            logging.info("Posting translation request...")
+
+            try:
+                response = await client.post(
+                    endpoint + "/translate",
+                    params=params,
+                    json=body,
+                    timeout=timeout,
+                )
+
+            except httpx.TimeoutException:
+                error = TranslationError(f"TimeoutError after {timeout}")
+
+            # e.g. ConnectError or RemoteProtocolError
+            except httpx.HTTPError as e:
+                error = TranslationError(f"{type(e).__name__}: {e}")
+
+            else:
+                # Hold back every request until the quota is available again
+                if response.status_code == 429:
+                    retry_after = get_retry_after(response.headers)
+                    logging.warning(f"Rate limited, retrying after {retry_after=}")
+                    rate_limiter.pause(retry_after)
+                    error = TranslationError("Rate limited", status_code=429)
+                    continue
+
+                if response.status_code < 500:
+                    break
+
+                error = TranslationError(
+                    f"Server error {response.status_code}",
+                    status_code=response.status_code,
+                )
+
+            # No wait after the last attempt
+            if attempt + 1 < max_attempts:
+                backoff = get_backoff(attempt)
+                logging.warning(f"{error}, retrying after {backoff=}")
+                await asyncio.sleep(backoff)
+
+        else:
+            logging.error(f"{error} after {max_attempts=}")
+            raise error
+
+    try:
+        response.raise_for_status()
+
+    except httpx.HTTPStatusError as e:
+        raise TranslationError(
+            f"HTTPError: {e}",
+            status_code=response.status_code,
+        ) from e
+
+    try:
+        return response.json()
+
+    except ValueError as e:
+        raise TranslationError(f"Invalid response: {e}") from e
+
+
+async def translate_chunk_async(
+    client: httpx.AsyncClient,
+    semaphore: asyncio.Semaphore,
+    texts: list[str],
+    from_language: str,
+) -> list[Union[str, None]]:
+    """Translates a chunk of texts without blocking the event loop.
+
+    Bisected as translate_chunk(), both halves concurrently
+
+    Args:
+        client (httpx.AsyncClient): shared async client
+        semaphore (asyncio.Semaphore): limits the number of concurrent requests
+        texts (list[str]): texts to translate
+        from_language (str): language code to translate from
+
+    Returns:
+        list[Union[str, None]]: translations, None for texts which failed
+    """
     try:
-        response = requests.post(
-            endpoint + "/translate",
-            params=params,
-            headers=headers,
-            json=body,
-            timeout=timeout,
+        response = await translate_async(
+            client=client,
+            semaphore=semaphore,
+            texts=texts,
+            timeout=20,
+            from_language=from_language,
+            to_language="en",
         )
 
-    except requests.exceptions.Timeout:
-        logging.error(f"TimeoutError after {timeout}")
-        return None
+    except TranslationError as e:
+        if not e.is_rejected:
+            logging.error(f"Could not translate chunk of {len(texts)=}, {e}")
+            return [None] * len(texts)
+
+        if len(texts) == 1:
+            logging.error(f"Could not translate {texts=}, {e}")
+            return [None]
 
     else:
-        try:
-            response.raise_for_status()
+        if len(response) == len(texts):
+            return [r["translations"][0]["text"] for r in response]
 
-        except requests.exceptions.HTTPError as e:
-            logging.error(f"HTTPError: {e}")
-            return None
+        logging.error(f"Got {len(response)=} translations for {len(texts)=}")
+        return [None] * len(texts)
 
-        else:
-            response = response.json()
-            return response
+    middle = len(texts) // 2
+
+    translations_left, translations_right = await asyncio.gather(
+        translate_chunk_async(client, semaphore, texts[:middle], from_language),
+        translate_chunk_async(client, semaphore, texts[middle:], from_language),
+    )
+
+    return translations_left + translations_right
 
 
 async def translate_market_async(
     market: str,
     df: pd.DataFrame,
-):
-    """Translates a market texts into English.
+    concurrency: int = 10,
+    max_characters: int = max_characters,
+    memory: TranslationMemory = None,
+) -> pd.DataFrame:
+    """Translates a market texts into English concurrently.
 
     Expects a 'text' column
     Translation results are saved into new columns
 
+    With a translation memory, texts translated before in any market or run
+    are not sent again and new translations are added to it
+
+    Rows which could not be translated are left as NaN
+
     Args:
         market (str): market code
         df (pd.DataFrame): dataframe
+        concurrency (int, optional): max concurrent requests. Defaults to 10.
+        max_characters (int, optional): max characters per request.
+        Defaults to max_characters.
+        memory (TranslationMemory, optional): translation memory.
+        Defaults to None.
 
     Returns:
         pd.DataFrame: dataframe with translated text
     """
     logging.info("Translating market concurrently...")
 
-    # Each translate request is limited to 50,000 characters, including translation
-    # Split the text column into chunks of 200
-    n = 20
-    df_chunks = [df[i : i + n] for i in range(0, len(df), n)]
+    from_language = translator_language_codes[market]
+
+    texts = df["text"].tolist()
+
+    if memory is not None:
+        translations_memory = memory.get(texts, from_language=from_language)
+        logging.info(f"{memory.stats()=}")
+
+    else:
+        translations_memory = {}
+
+    # Only post texts which are not in the translation memory
+    texts_missing = [text for text in texts if text not in translations_memory]
+
+    chunks = pack_texts(
+        texts_missing,
+        max_characters=max_characters,
+    )
 
-    tasks = set()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(headers=headers) as client:
+        tasks = {
+            asyncio.create_task(
+                translate_chunk_async(
+                    client=client,
+                    semaphore=semaphore,
+                    texts=[texts_missing[i] for i in chunk],
+                    from_language=from_language,
+                )
+            ): chunk
+            for chunk in chunks
+        }
 
-    for df_chunk in df_chunks:
-        task = asyncio.create_task(
-            translate_async(
-                texts=df_chunk["text"].tolist(),
-                timeout=20,
-                from_language=translator_language_codes[market],
-                to_language="en",
+        pending = set(tasks)
+
+        # Store each chunk as it completes so a failed chunk loses only its rows
+        while pending:
+            done, pending = await asyncio.wait(
+                pending,
+                return_when=asyncio.FIRST_COMPLETED,
             )
-        )
 
-        tasks.add(task)
+            for task in done:
+                chunk_texts = [texts_missing[i] for i in tasks[task]]
+                chunk_translations = task.result()
 
-        # To prevent keeping references to finished tasks forever
-        task.add_done_callback(tasks.discard)
+                translations_memory.update(
+                    {
+                        text: translation
+                        for text, translation in zip(chunk_texts, chunk_translations)
+                        if translation is not None
+                    }
+                )
 
-        # Sleep to avoid rate limiting
-        time.sleep(1)
+                if memory is not None:
+                    memory.put(
+                        chunk_texts,
+                        chunk_translations,
+                        from_language=from_language,
+                    )
 
-    results = await asyncio.gather(
-        *tasks,
-        return_exceptions=True,
-    )
+    n_failed = sum(text not in translations_memory for text in texts)
 
-    return results
+    if n_failed:
+        logging.error(f"{market=}, {n_failed=} rows could not be translated")
+
+    # Copy text to a new column before overwriting for reference
+    df["text_orig"] = df["text"]
+    df["text"] = [translations_memory.get(text) for text in texts]
+
+    return df
 
 
 if __name__ == "__main__":
@@ -287,6 +786,20 @@ if __name__ == "__main__":
         required=True,
     )
 
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        default=10,
+    )
+
+    parser.add_argument(
+        "-mp",
+        "--memory_path",
+        type=str,
+        default=None,
+    )
+
     args = parser.parse_args()
 
     market = args.market
@@ -302,7 +815,6 @@ if __name__ == "__main__":
         )
         .dropna(subset=["text"])
         .drop_duplicates(subset=["text"])
-        .assign(text_orig=lambda df: df["text"])
     )
 
     print(f"{market=}, {len(df)=}")
@@ -310,31 +822,28 @@ if __name__ == "__main__":
     # Statements were concatenated with |, replace with a full stop
     df["text"] = df["text"].str.replace(" |", ". ")
 
-    result_chunks = asyncio.run(
+    if args.memory_path:
+        memory = TranslationMemory(Path(args.memory_path))
+
+    else:
+        memory = None
+
+    # Original text will be copied to 'text_orig' column
+    df = asyncio.run(
         translate_market_async(
             market,
             df,
+            concurrency=args.concurrency,
+            memory=memory,
         )
     )
 
-    texts_translations = []
-
-    # Loop over chunks of results > text in each chunk
-    for result_chunk in result_chunks:
-        for result in result_chunk:
-            text_translated = result["translations"][0]["text"]
-            texts_translations.append(text_translated)
-
-    logging.info(f"{market=}, {len(texts_translations)=}")
-    assert len(df) == len(texts_translations), "Missing translation responses"
-
-    # Original text is already available in 'text_orig' column
-    df["text"] = texts_translations
+    logging.info(f"{market=}, {len(df)=}")
 
-    df.to_csv(
+    write_dataset(
+        df.set_index("pvid"),
         Path(
             data_path,
-            f"{market}_translated.csv",
+            f"{market}_translated.parquet",
         ),
-        index=False,
     )
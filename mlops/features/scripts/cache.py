@@ -0,0 +1,188 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable
+
+import pandas as pd
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="[%(asctime)s] %(message)s",
+    datefmt="%d/%m/%y %H:%M:%S",
+)
+
+
+def get_signature(path: Path) -> tuple[int, int]:
+    """Gets the latest modification time and total size of a file or directory.
+
+    Args:
+        path (Path): file or directory, e.g. a partitioned Parquet dataset
+
+    Returns:
+        tuple[int, int]: modification time in nanoseconds and size in bytes
+    """
+    if path.is_dir():
+        stats = [file.stat() for file in path.rglob("*") if file.is_file()]
+
+        return (
+            max((stat.st_mtime_ns for stat in stats), default=0),
+            sum(stat.st_size for stat in stats),
+        )
+
+    stat = path.stat()
+
+    return stat.st_mtime_ns, stat.st_size
+
+
+class DatasetCache:
+    """Caches loaded dataframes by file path, content signature and read options.
+
+    A file changed on disk gets a new key so is loaded again
+    Callers get their own copy so mutating it does not affect later reads
+    Parsed frames are spilled to Parquet so the next process starts warm
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 2_000_000_000,
+        spill_dir: Path = None,
+    ):
+        """Creates an empty cache.
+
+        Args:
+            max_bytes (int, optional): max memory of cached dataframes.
+            Defaults to 2_000_000_000.
+            spill_dir (Path, optional): directory to spill parsed dataframes to.
+            Defaults to None, no spilling.
+        """
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def read(
+        self,
+        file_path: Path,
+        load: Callable[..., pd.DataFrame],
+        **options,
+    ) -> pd.DataFrame:
+        """Reads a dataframe from memory, the spill directory or by loading it.
+
+        Args:
+            file_path (Path): file path passed to load
+            load (Callable[..., pd.DataFrame]): function loading the file
+            **options: hashable read options passed to load
+
+        Returns:
+            pd.DataFrame: a copy of the cached dataframe
+        """
+        key = (
+            str(file_path.resolve()),
+            *get_signature(file_path),
+            f"{load.__module__}.{load.__qualname__}",
+            tuple(sorted(options.items())),
+        )
+
+        with self._lock:
+            df = self._entries.get(key)
+
+            if df is not None:
+                self._entries.move_to_end(key)
+
+        if df is None:
+            df = self._read_spill(key)
+
+        if df is None:
+            df = load(file_path, **options)
+
+            # Parquet is already fast to read
+            if file_path.suffix != ".parquet":
+                self._write_spill(key, df)
+
+        self._put(key, df)
+
+        return self._copy(df)
+
+    def _copy(self, df: pd.DataFrame) -> pd.DataFrame:
+        # With copy on write, a shallow copy only copies data when modified
+        if pd.options.mode.copy_on_write:
+            return df.copy(deep=False)
+
+        return df.copy()
+
+    def _put(
+        self,
+        key: tuple,
+        df: pd.DataFrame,
+    ):
+        size = int(df.memory_usage(deep=True).sum())
+
+        with self._lock:
+            if key in self._entries:
+                return
+
+            self._entries[key] = df
+            self._sizes[key] = size
+            self._bytes += size
+
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                key_evicted, _ = self._entries.popitem(last=False)
+                self._bytes -= self._sizes.pop(key_evicted)
+
+    def _get_spill_path(self, key: tuple) -> Path:
+        # Files of the same path share a prefix so older versions can be removed
+        path_hash = hashlib.sha1(key[0].encode("utf8")).hexdigest()[:16]
+        key_hash = hashlib.sha1(repr(key).encode("utf8")).hexdigest()[:16]
+
+        return Path(self.spill_dir, f"{path_hash}_{key_hash}.parquet")
+
+    def _read_spill(self, key: tuple) -> pd.DataFrame:
+        if self.spill_dir is None:
+            return None
+
+        spill_path = self._get_spill_path(key)
+
+        if not spill_path.exists():
+            return None
+
+        logging.info(f"Reading spilled dataset {spill_path=}")
+
+        return pd.read_parquet(spill_path)
+
+    def _write_spill(
+        self,
+        key: tuple,
+        df: pd.DataFrame,
+    ):
+        if self.spill_dir is None:
+            return
+
+        self.spill_dir.mkdir(parents=True, exist_ok=True)
+
+        spill_path = self._get_spill_path(key)
+        path_hash = spill_path.name.split("_")[0]
+
+        # Remove spills of older versions of the same file
+        for spill_path_old in self.spill_dir.glob(f"{path_hash}_*.parquet"):
+            spill_path_old.unlink()
+
+        try:
+            df.to_parquet(spill_path, index=True)
+
+        # e.g. object columns mixing types which Parquet can not store
+        except (TypeError, ValueError) as error:
+            logging.warning(f"Could not spill dataset {spill_path=}: {error}")
+            spill_path.unlink(missing_ok=True)
+
+
+dataset_cache = DatasetCache(
+    spill_dir=Path(
+        ".cache",
+        "datasets",
+    ),
+)
@@ -0,0 +1,97 @@
+import shutil
+from pathlib import Path
+
+import pandas as pd
+
+# Low cardinality columns stored as categories
+categorical_columns = [
+    "market",
+    "gtin",
+    "label",
+]
+
+
+def to_categorical(df: pd.DataFrame) -> pd.DataFrame:
+    """Converts low cardinality string columns to categories.
+
+    Columns holding lists, e.g. multi-label 'label', or with mostly unique
+    values are left as they are
+
+    Args:
+        df (pd.DataFrame): dataframe
+
+    Returns:
+        pd.DataFrame: dataframe with categorical columns
+    """
+    for col in categorical_columns:
+        if (
+            col in df
+            and df[col].map(lambda value: isinstance(value, str)).all()
+            and df[col].nunique() < len(df) / 2
+        ):
+            df[col] = df[col].astype("category")
+
+    return df
+
+
+def write_dataset(
+    df: pd.DataFrame,
+    path: Path,
+    partition_cols: list[str] = None,
+):
+    """Writes a dataframe as Parquet, keeping its index.
+
+    The dataset is written to a temporary path and replaces any existing
+    dataset once complete, as pyarrow adds files to an existing partitioned
+    directory rather than overwriting it
+
+    Args:
+        df (pd.DataFrame): dataframe
+        path (Path): Parquet file, or directory if partitioned
+        partition_cols (list[str], optional): columns to partition by,
+        e.g. ["market"]. Defaults to None.
+    """
+    path_tmp = path.with_name(path.name + ".tmp")
+
+    if path_tmp.is_dir():
+        shutil.rmtree(path_tmp)
+
+    to_categorical(df.copy()).to_parquet(
+        path_tmp,
+        engine="pyarrow",
+        index=True,
+        partition_cols=partition_cols,
+    )
+
+    if path.is_dir():
+        shutil.rmtree(path)
+
+    path_tmp.replace(path)
+
+
+def read_dataset(
+    path: Path,
+    columns: list[str] = None,
+    filters: list[tuple] = None,
+) -> pd.DataFrame:
+    """Reads a Parquet dataset written by write_dataset.
+
+    Only the requested columns and partitions are read from disk
+
+    Args:
+        path (Path): Parquet file or partitioned directory
+        columns (list[str], optional): columns to read. Defaults to None, all.
+        filters (list[tuple], optional): row filters, e.g.
+        [("market", "in", ["GB,IE", "NL"])]. Defaults to None.
+
+    Returns:
+        pd.DataFrame: dataframe
+    """
+    df = pd.read_parquet(
+        path,
+        engine="pyarrow",
+        columns=columns,
+        filters=filters,
+    )
+
+    return df
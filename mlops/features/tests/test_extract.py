@@ -0,0 +1,149 @@
+import logging
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from sqlalchemy import Engine, create_engine, text
+from tenacity import wait_none
+
+from mlops.features.raw.scripts import extract
+
+
+@pytest.fixture
+def engine(tmp_path) -> Engine:
+    """SQLite stand-in for the SQL Server database, shared across threads."""
+    engine = create_engine(f"sqlite:///{Path(tmp_path, 'database.sqlite')}")
+
+    with engine.begin() as con:
+        con.execute(text("CREATE TABLE products (pvid, gtin, market_id, text)"))
+        con.execute(
+            text("INSERT INTO products VALUES (:pvid, :gtin, :market_id, :text)"),
+            [
+                {
+                    "pvid": str(i),
+                    "gtin": f"{i:013d}",
+                    "market_id": i % 2,
+                    "text": f"text {i}",
+                }
+                for i in range(10)
+            ],
+        )
+
+    return engine
+
+
+@pytest.fixture
+def query_path(tmp_path) -> Path:
+    query_path = Path(tmp_path, "query.sql")
+    query_path.write_text(
+        "SELECT pvid, gtin, text FROM products WHERE market_id = :market_id"
+    )
+
+    return query_path
+
+
+def test_run_to_file_streams_chunks(engine, query_path, tmp_path, caplog):
+    output_path = Path(tmp_path, "0.csv")
+
+    with caplog.at_level(logging.INFO):
+        n_rows = extract.run_to_file(
+            path=query_path,
+            output_path=output_path,
+            params={"market_id": 0},
+            chunksize=2,
+            engine=engine,
+        )
+
+    df = pd.read_csv(output_path, dtype=str)
+
+    assert n_rows == 5
+    assert df["pvid"].to_list() == ["0", "2", "4", "6", "8"]
+
+    # One log line per chunk of 2 rows
+    assert sum("n_rows=" in record.message for record in caplog.records) == 3
+
+
+def test_run_to_file_applies_dtype(engine, tmp_path):
+    query_path = Path(tmp_path, "query.sql")
+    query_path.write_text("SELECT pvid, CAST(gtin AS INTEGER) AS gtin FROM products")
+
+    output_path = Path(tmp_path, "all.csv")
+
+    extract.run_to_file(
+        path=query_path,
+        output_path=output_path,
+        chunksize=3,
+        dtype={"pvid": "int64", "gtin": "string"},
+        engine=engine,
+    )
+
+    df = pd.read_csv(output_path, dtype=str)
+
+    assert df["pvid"].to_list() == [str(i) for i in range(10)]
+    assert df["gtin"].to_list() == [str(i) for i in range(10)]
+
+
+def test_run_to_file_writes_header_without_rows(engine, query_path, tmp_path):
+    output_path = Path(tmp_path, "empty.csv")
+
+    n_rows = extract.run_to_file(
+        path=query_path,
+        output_path=output_path,
+        params={"market_id": 2},
+        engine=engine,
+    )
+
+    assert n_rows == 0
+    assert output_path.read_text().strip() == "pvid,gtin,text"
+
+
+def test_run_to_file_removes_temporary_file_on_error(engine, query_path, tmp_path):
+    output_path = Path(tmp_path, "0.csv")
+
+    with engine.begin() as con:
+        con.execute(text("INSERT INTO products VALUES ('x', '', 0, '')"))
+
+    # Fails on the last chunk, after the others were written
+    with pytest.raises(ValueError):
+        extract.run_to_file(
+            path=query_path,
+            output_path=output_path,
+            params={"market_id": 0},
+            chunksize=2,
+            dtype={"pvid": "int64"},
+            engine=engine,
+        )
+
+    assert list(tmp_path.glob("0.csv*")) == []
+
+
+def test_run_markets_to_files(engine, query_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(extract.run_market_to_file.retry, "wait", wait_none())
+
+    df_timings = extract.run_markets_to_files(
+        path=query_path,
+        output_dir=tmp_path,
+        params={
+            "PL": {"market_id": 0},
+            "CZ": {"market_id": 1},
+            "HU": {},
+        },
+        chunksize=2,
+        engine=engine,
+    )
+
+    assert df_timings.index.to_list() == ["PL", "CZ", "HU"]
+    assert df_timings.loc[["PL", "CZ"], "rows"].to_list() == [5, 5]
+    assert pd.notna(df_timings.loc["HU", "error"])
+    assert not Path(tmp_path, "HU.csv").exists()
+
+
+def test_run_markets_to_files_without_markets(tmp_path):
+    df_timings = extract.run_markets_to_files(
+        path=Path(tmp_path, "query.sql"),
+        output_dir=tmp_path,
+        params={},
+    )
+
+    assert df_timings.empty
+    assert df_timings.index.name == "market"
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+
+from mlops.features.processed.scripts.preprocess import normalize_gtin, validate_gtin
+
+
+def get_check_digit(gtin: str) -> int:
+    """Reference GS1 check digit, weights 3, 1 from the right of the payload."""
+    total = sum(
+        int(digit) * (3 if i % 2 == 0 else 1)
+        for i, digit in enumerate(reversed(gtin[:-1]))
+    )
+
+    return (10 - total % 10) % 10
+
+
+def test_normalize_gtin_pads_and_strips():
+    s = pd.Series(["123", "12345678901234", "4006381333931"], index=[7, 8, 9])
+
+    assert normalize_gtin(s).to_list() == [
+        "0000000000123",
+        "2345678901234",
+        "4006381333931",
+    ]
+    assert normalize_gtin(s).index.to_list() == [7, 8, 9]
+
+
+def test_validate_gtin_check_digit():
+    s = pd.Series(
+        [
+            "4006381333931",
+            "5901234123457",
+            "0000000000000",
+            "4006381333932",
+            "40063813339a1",
+            "400638133393",
+            None,
+        ],
+        index=list("abcdefg"),
+    )
+
+    valid = validate_gtin(s)
+
+    assert valid.index.equals(s.index)
+    assert valid.to_list() == [True, True, True, False, False, False, False]
+
+
+def test_validate_gtin_matches_reference():
+    rng = np.random.default_rng(0)
+    gtins = ["".join(map(str, digits)) for digits in rng.integers(0, 10, (500, 13))]
+
+    valid = validate_gtin(pd.Series(gtins))
+
+    assert valid.to_list() == [get_check_digit(g) == int(g[-1]) for g in gtins]
+    assert 0 < valid.sum() < len(gtins)
+
+
+def test_validate_gtin_empty():
+    valid = validate_gtin(pd.Series([], dtype=str))
+
+    assert valid.empty
+    assert valid.dtype == bool
+
+    assert validate_gtin(pd.Series(["", None])).to_list() == [False, False]
@@ -0,0 +1,132 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from sqlalchemy import Engine, create_engine, text
+
+from mlops.features.raw.scripts.incremental import (
+    merge_delta,
+    read_json,
+    run_markets_incremental,
+)
+
+
+def write_csv(path: Path, rows: list[tuple]) -> Path:
+    pd.DataFrame(rows, columns=["pvid", "text"]).to_csv(path, index=False)
+
+    return path
+
+
+@pytest.fixture
+def engine(tmp_path) -> Engine:
+    """SQLite stand-in for the SQL Server database, rows dated by modification."""
+    engine = create_engine(f"sqlite:///{Path(tmp_path, 'database.sqlite')}")
+
+    with engine.begin() as con:
+        con.execute(text("CREATE TABLE products (pvid, market_id, text, modified)"))
+
+    return engine
+
+
+def insert(engine: Engine, rows: list[tuple]):
+    with engine.begin() as con:
+        con.execute(
+            text("INSERT INTO products VALUES (:pvid, :market_id, :text, :modified)"),
+            [dict(zip(["pvid", "market_id", "text", "modified"], row)) for row in rows],
+        )
+
+
+@pytest.fixture
+def query_path(tmp_path) -> Path:
+    query_path = Path(tmp_path, "query.sql")
+    query_path.write_text(
+        "SELECT pvid, text FROM products WHERE market_id = :market_id "
+        "AND modified >= :from_date AND modified < :to_date"
+    )
+
+    return query_path
+
+
+def test_merge_delta_replaces_changed_rows_in_chunks(tmp_path):
+    output_path = write_csv(
+        Path(tmp_path, "market.csv"),
+        [(f"{i:02d}", f"text {i}") for i in range(10)],
+    )
+
+    delta_path = write_csv(
+        Path(tmp_path, "delta.csv"),
+        [("03", "changed"), ("10", "new"), ("07", "old"), ("07", "changed")],
+    )
+
+    n_rows = merge_delta(output_path, delta_path, chunksize=3)
+
+    df = pd.read_csv(output_path, dtype=str)
+
+    assert n_rows == len(df) == 11
+    assert df["pvid"].is_unique
+
+    # Leading zeros are kept and the last delta version of a row wins
+    assert df.set_index("pvid")["text"].to_dict() == {
+        **{f"{i:02d}": f"text {i}" for i in range(10)},
+        "03": "changed",
+        "07": "changed",
+        "10": "new",
+    }
+
+    assert not Path(tmp_path, "market.csv.tmp").exists()
+
+
+def test_merge_delta_creates_and_keeps_empty_datasets(tmp_path):
+    output_path = Path(tmp_path, "market.csv")
+    delta_path = write_csv(Path(tmp_path, "delta.csv"), [])
+
+    assert merge_delta(output_path, delta_path) == 0
+    assert merge_delta(output_path, delta_path) == 0
+
+    assert pd.read_csv(output_path).columns.to_list() == ["pvid", "text"]
+
+
+def test_run_markets_incremental_extracts_from_watermark(engine, query_path, tmp_path):
+    insert(engine, [("1", 0, "a", "2024-01-01"), ("2", 1, "b", "2024-01-01")])
+
+    manifest = run_markets_incremental(
+        path=query_path,
+        output_dir=tmp_path,
+        market_ids={"gb": 0, "fr": 1},
+        from_date="2023-01-01",
+        to_date="2024-02-01",
+        engine=engine,
+    )
+
+    assert {market: manifest[market]["rows_delta"] for market in manifest} == {
+        "gb": 1,
+        "fr": 1,
+    }
+
+    # A row changed and a row added after the watermark of the first run
+    insert(engine, [("1", 0, "a changed", "2024-02-10"), ("3", 0, "c", "2024-02-11")])
+
+    manifest = run_markets_incremental(
+        path=query_path,
+        output_dir=tmp_path,
+        market_ids={"gb": 0, "fr": 1},
+        from_date="2023-01-01",
+        to_date="2024-03-01",
+        engine=engine,
+    )
+
+    assert manifest["gb"]["from_date"] == "2024-02-01"
+    assert manifest["gb"]["rows_delta"] == 2
+    assert manifest["gb"]["rows"] == 2
+    assert manifest["fr"]["rows_delta"] == 0
+
+    # Downstream stages read the manifest from disk
+    assert read_json(Path(tmp_path, "extract_manifest.json")) == manifest
+    assert read_json(Path(tmp_path, "extract_state.json")) == {
+        "gb": {"watermark": "2024-03-01"},
+        "fr": {"watermark": "2024-03-01"},
+    }
+
+    df = pd.read_csv(Path(tmp_path, "gb.csv"), dtype=str)
+
+    assert df.set_index("pvid")["text"].to_dict() == {"1": "a changed", "3": "c"}
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from mlops.features.processed.scripts.index import LSHIndex
+from mlops.features.processed.scripts.similarity import filter_similar_text
+
+
+def get_df(n_texts: int = 300, seed: int = 0) -> pd.DataFrame:
+    """Gets texts of random words, many with near duplicates."""
+    gen = np.random.default_rng(seed)
+    words = np.array([f"w{i}" for i in range(200)])
+
+    texts = []
+
+    for _ in range(n_texts):
+        if texts and gen.random() < 0.5:
+            # Near duplicate of an earlier text, one word replaced or added
+            text = texts[gen.integers(len(texts))].split()
+            text[gen.integers(len(text))] = gen.choice(words)
+
+            if gen.random() < 0.5:
+                text.append(gen.choice(words))
+
+            texts.append(" ".join(text))
+
+        else:
+            texts.append(" ".join(gen.choice(words, size=gen.integers(8, 16))))
+
+    return pd.DataFrame(
+        {"text": texts},
+        index=pd.Index([str(i) for i in range(n_texts)], name="pvid"),
+    )
+
+
+def get_clusters(pvids: pd.Index, cluster_ids: np.ndarray) -> set[frozenset]:
+    return {
+        frozenset(group)
+        for group in pd.Series(pvids).groupby(cluster_ids).agg(frozenset)
+    }
+
+
+def assert_index_equals_batch(index: LSHIndex, df: pd.DataFrame):
+    df_keep, df_remove = filter_similar_text(df, threshold=0.5)
+    df_batch = pd.concat([df_keep, df_remove]).loc[df.index]
+
+    assert set(index.df_rows.index[index.df_rows["keep"]]) == set(df_keep.index)
+
+    assert get_clusters(
+        index.df_rows.index, index.df_rows["cluster_id"].to_numpy()
+    ) == get_clusters(df_batch.index, df_batch["cluster_id"].to_numpy())
+
+
+@pytest.mark.parametrize("n_splits", [1, 3, 7])
+def test_incremental_equals_batch(tmp_path, n_splits):
+    df = get_df()
+
+    for positions in np.array_split(np.arange(len(df)), n_splits):
+        index = LSHIndex(path=tmp_path, threshold=0.5)
+        index.update(df.iloc[positions])
+        index.save()
+
+    assert_index_equals_batch(LSHIndex(path=tmp_path, threshold=0.5), df)
+
+
+def test_changed_texts_are_replaced(tmp_path):
+    df = get_df()
+
+    index = LSHIndex(path=tmp_path, threshold=0.5)
+    index.update(df)
+    index.save()
+
+    # Changed rows of the refresh, as in the delta files, with the key column
+    df_changed = get_df(seed=1).iloc[::10]
+    df_delta = pd.concat([df_changed, df.iloc[1::10]]).reset_index()
+
+    index = LSHIndex(path=tmp_path, threshold=0.5)
+    df_changes = index.update(df_delta)
+
+    df.loc[df_changed.index, "text"] = df_changed["text"]
+
+    assert set(df_changes.index[df_changes["is_changed"]]) == set(df_changed.index)
+    assert not df_changes["is_new"].any()
+    assert_index_equals_batch(index, df)
+
+
+def test_unchanged_rows_are_skipped(tmp_path):
+    df = get_df()
+
+    index = LSHIndex(path=tmp_path, threshold=0.5)
+    index.update(df)
+
+    df_changes = index.update(df)
+
+    assert df_changes.empty
+    assert_index_equals_batch(index, df)
@@ -0,0 +1,113 @@
+import inspect
+
+import numpy as np
+import pytest
+from datasketch import MinHash
+from datasketch.lsh import _optimal_param
+
+from mlops.features.processed.scripts.minhash import (
+    compute_signatures,
+    get_band_buckets,
+    get_candidate_pairs,
+    get_optimal_params,
+)
+from mlops.features.processed.scripts.shingles import get_words, shingle_words
+
+texts = [
+    "Chocolate biscuits with milk chocolate",
+    "chocolate BISCUITS, with milk chocolate!",
+    "Ingredients: wheat flour, sugar, palm oil",
+    "",
+    "Salted butter",
+]
+
+# datasketch 2 defaults to another permutation scheme than the pinned 1.6
+legacy = (
+    {"scheme": "legacy"} if "scheme" in inspect.signature(MinHash).parameters else {}
+)
+
+
+def get_datasketch_signature(text: str, num_perm: int, seed: int) -> np.ndarray:
+    minhash = MinHash(num_perm=num_perm, seed=seed, **legacy)
+    minhash.update_batch([word.encode("utf8") for word in set(get_words(text))])
+
+    return minhash.hashvalues
+
+
+@pytest.mark.parametrize("max_block_shingles", [1, 4, 100_000])
+def test_compute_signatures_matches_datasketch(max_block_shingles):
+    signatures = compute_signatures(
+        [shingle_words(text) for text in texts],
+        num_perm=64,
+        seed=7,
+        max_block_shingles=max_block_shingles,
+    )
+
+    expected = np.array(
+        [get_datasketch_signature(text, num_perm=64, seed=7) for text in texts]
+    )
+
+    assert signatures.dtype == np.uint64
+    np.testing.assert_array_equal(signatures, expected)
+
+
+def test_compute_signatures_no_rows():
+    assert compute_signatures([], num_perm=16).shape == (0, 16)
+
+
+@pytest.mark.parametrize("threshold", [0.5, 0.8, 0.9])
+def test_get_optimal_params_matches_datasketch(threshold):
+    assert get_optimal_params(threshold, 128) == _optimal_param(
+        threshold, 128, 0.5, 0.5
+    )
+
+
+def test_get_band_buckets_share_buckets_of_equal_bands():
+    signatures = np.array(
+        [
+            [1, 2, 3, 4, 5, 6],
+            [1, 2, 3, 9, 9, 9],
+            [9, 9, 9, 4, 5, 6],
+            [2, 1, 3, 6, 5, 4],
+        ],
+        dtype=np.uint64,
+    )
+
+    buckets = get_band_buckets(signatures, bands=2, rows=3)
+
+    assert buckets.shape == (4, 2)
+    assert buckets.dtype == np.uint64
+
+    # Equal band values share a bucket, the order of values matters
+    assert buckets[0, 0] == buckets[1, 0] != buckets[2, 0]
+    assert buckets[0, 1] == buckets[2, 1] != buckets[1, 1]
+    assert buckets[3, 0] != buckets[0, 0]
+    assert buckets[3, 1] != buckets[0, 1]
+
+    # Stable across runs so buckets of an index can be compared
+    np.testing.assert_array_equal(buckets, get_band_buckets(signatures, 2, 3))
+
+
+def test_get_candidate_pairs_links_bucket_members():
+    buckets = np.array(
+        [
+            [10, 20],
+            [11, 20],
+            [10, 21],
+            [10, 22],
+            [12, 23],
+        ],
+        dtype=np.uint64,
+    )
+
+    pairs = get_candidate_pairs(buckets)
+
+    # Bucket 10 links 0, 2 and 3 by consecutive members, bucket 20 links 0 and 1
+    assert pairs.tolist() == [[0, 1], [0, 2], [2, 3]]
+
+
+def test_get_candidate_pairs_without_matches():
+    buckets = np.arange(6, dtype=np.uint64).reshape(3, 2)
+
+    assert get_candidate_pairs(buckets).shape == (0, 2)
+    assert get_candidate_pairs(buckets[:0]).shape == (0, 2)
@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from mlops.features.processed.scripts.resample import (
+    downsample,
+    get_group_ranks,
+    get_rarest_labels,
+    sample_by_count,
+    sample_multilabel_by_count,
+    upsample,
+)
+
+
+@pytest.fixture
+def df() -> pd.DataFrame:
+    labels = ["a"] * 7 + ["b"] * 3 + ["c"] * 5 + [None] * 2
+
+    return pd.DataFrame(
+        {
+            "text": [f"text {i}" for i in range(len(labels))],
+            "label": labels,
+        },
+        index=pd.Index([f"p{i}" for i in range(len(labels))], name="pvid"),
+    )
+
+
+def test_get_group_ranks_are_permutations_within_groups():
+    codes = np.array([2, 0, 1, 0, 2, 2, 0, 0, 1])
+
+    ranks = get_group_ranks(codes, seed=1)
+
+    for code in np.unique(codes):
+        assert sorted(ranks[codes == code]) == list(range((codes == code).sum()))
+
+    np.testing.assert_array_equal(ranks, get_group_ranks(codes, seed=1))
+
+
+def test_get_group_ranks_are_uniform():
+    codes = np.zeros(4, dtype=np.int64)
+
+    # Each row ranked first about as often as the others over seeds
+    firsts = [np.argmin(get_group_ranks(codes, seed=seed)) for seed in range(2000)]
+
+    assert np.bincount(firsts).min() > 400
+
+
+def test_downsample(df):
+    df_sampled = downsample(df, seed=3)
+
+    assert df_sampled["label"].value_counts().to_dict() == {"a": 3, "b": 3, "c": 3}
+    assert df_sampled.index.is_unique
+    assert df_sampled.equals(downsample(df, seed=3))
+
+
+def test_upsample(df):
+    df_sampled = upsample(df, count=8, seed=3)
+
+    assert df_sampled["label"].value_counts().to_dict() == {"a": 8, "b": 8, "c": 8}
+
+    # Every row of a label is used once before any row is used again
+    uses = df_sampled.index.value_counts()
+
+    for label in ["a", "b", "c"]:
+        label_uses = uses[df.index[df["label"] == label]]
+        assert label_uses.max() - label_uses.min() <= 1
+
+    # Defaults to the count of the most frequent label, which keeps all its rows
+    df_sampled = upsample(df, seed=3)
+
+    assert df_sampled["label"].value_counts().to_dict() == {"a": 7, "b": 7, "c": 7}
+    assert set(df.index[df["label"] == "a"]) <= set(df_sampled.index)
+
+
+def test_sample_by_count(df):
+    df_balanced, df_excluded = sample_by_count(df, count=4, seed=3)
+
+    assert df_balanced["label"].value_counts().to_dict() == {"a": 4, "c": 4, "b": 3}
+
+    # Excluded rows are the labelled rows not sampled
+    assert len(df_excluded) == 4
+    assert df_excluded["label"].notna().all()
+    assert not set(df_balanced["text"]) & set(df_excluded["text"])
+
+
+def test_get_rarest_labels():
+    s = pd.Series([["a", "b"], ["a"], ["a", "c", "b"], [], ["c", "a"], ["b"]])
+
+    codes = get_rarest_labels(s)
+
+    # Codes by first appearance: a 0, b 1, c 2, empty list 3
+    # a appears 4 times, b 3 times, c twice
+    assert codes.tolist() == [1, 0, 2, 3, 2, 1]
+
+
+def test_sample_multilabel_by_count():
+    df = pd.DataFrame(
+        {
+            "text": [f"text {i}" for i in range(8)],
+            "label": [["a"], ["a"], ["a"], ["a", "b"], [], [], [], ["a"]],
+        }
+    )
+
+    df_balanced, df_excluded = sample_multilabel_by_count(df, count=2, seed=3)
+
+    # The row with the rare label is kept whatever its frequent label
+    assert "text 3" in set(df_balanced["text"])
+    assert len(df_balanced) == 5
+    assert sum(not labels for labels in df_balanced["label"]) == 2
+    assert len(df_excluded) == 3
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from mlops.features.processed.scripts.minhash import (
+    get_error_rates,
+    get_optimal_params,
+    get_tuned_params,
+    hash_token,
+)
+from mlops.features.processed.scripts.shingles import shingle_chars, shingle_words
+
+
+def get_recall(threshold: float, bands: int, rows: int) -> float:
+    _, false_negative = get_error_rates(threshold, bands, rows)
+
+    return 1 - false_negative / (1 - threshold)
+
+
+def test_shingle_words_unigrams_are_datasketch_hashes():
+    shingles = shingle_words("Milk, milk CHOCOLATE!")
+
+    assert shingles.dtype == np.uint32
+    assert shingles.tolist() == sorted({hash_token("milk"), hash_token("chocolate")})
+
+
+def test_shingle_words_ngrams():
+    bigrams = shingle_words("milk chocolate biscuits", n=2)
+
+    assert len(bigrams) == 2
+    assert np.array_equal(bigrams, shingle_words("Milk chocolate, biscuits", n=2))
+
+    # Unlike unigrams, n-grams depend on word order
+    assert not np.array_equal(bigrams, shingle_words("biscuits chocolate milk", n=2))
+    assert np.array_equal(
+        shingle_words("milk chocolate biscuits"),
+        shingle_words("biscuits chocolate milk"),
+    )
+
+    # Fewer words than n is one shingle
+    assert len(shingle_words("milk chocolate", n=3)) == 1
+    assert len(shingle_words("milk", n=3)) == 1
+    assert len(shingle_words("", n=3)) == 0
+
+
+def test_shingle_chars():
+    shingles = shingle_chars("Salted  butter!", k=5)
+
+    # Words are joined by one space, "salted butter" has 13 - 5 + 1 k-grams
+    assert shingles.dtype == np.uint32
+    assert len(shingles) == 9
+    assert np.array_equal(shingles, shingle_chars("salted butter", k=5))
+
+    assert len(shingle_chars("aaaaaaa", k=3)) == 1
+    assert len(shingle_chars("abc", k=5)) == 1
+    assert len(shingle_chars("!?", k=5)) == 0
+
+
+@pytest.mark.parametrize("recall", [0.9, 0.95, 0.99])
+def test_get_tuned_params_reaches_recall(recall):
+    bands, rows = get_tuned_params(threshold=0.8, num_perm=128, recall=recall)
+
+    assert bands * rows <= 128
+    assert get_recall(0.8, bands, rows) >= recall
+
+    # Higher recall than the balanced parameters of datasketch
+    assert get_recall(0.8, bands, rows) >= get_recall(
+        0.8, *get_optimal_params(0.8, 128)
+    )
+
+
+def test_get_tuned_params_unreachable_recall():
+    bands, rows = get_tuned_params(threshold=0.8, num_perm=16, recall=1.0)
+
+    # Falls back to the highest recall, every band of one value
+    assert (bands, rows) == (16, 1)
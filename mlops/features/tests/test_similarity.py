@@ -0,0 +1,179 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from mlops.features.processed.scripts.similarity import (
+    DisjointSet,
+    collapse_exact_duplicates,
+    filter_similar_text,
+    filter_similar_text_by_market,
+    get_clusters,
+    get_representatives,
+    get_shingles,
+    representative_rules,
+)
+
+
+def test_disjoint_set_union_and_find():
+    disjoint_set = DisjointSet(6)
+
+    disjoint_set.union(0, 1)
+    disjoint_set.union(2, 3)
+    disjoint_set.union(1, 3)
+    disjoint_set.union(3, 0)
+
+    assert disjoint_set.find(0) == disjoint_set.find(2)
+    assert disjoint_set.find(4) == 4
+    assert disjoint_set.size[disjoint_set.find(0)] == 4
+
+    # Components are numbered by their first element
+    assert disjoint_set.get_components().tolist() == [0, 0, 0, 0, 1, 2]
+
+
+def test_disjoint_set_restores_extends_and_resets():
+    disjoint_set = DisjointSet(3)
+    disjoint_set.union(0, 2)
+
+    restored = DisjointSet(3, parent=disjoint_set.parent, size=disjoint_set.size)
+    restored.extend(2)
+    restored.union(4, 2)
+
+    assert restored.get_components().tolist() == [0, 1, 0, 2, 0]
+
+    restored.reset([0, 2, 4])
+
+    assert restored.get_components().tolist() == [0, 1, 2, 3, 4]
+    assert restored.size == [1, 1, 1, 1, 1]
+
+
+def test_get_clusters_connected_components():
+    pairs = np.array([[4, 5], [0, 3], [3, 6], [1, 2]])
+
+    assert get_clusters(8, pairs).tolist() == [0, 1, 1, 0, 2, 2, 0, 3]
+    assert get_clusters(3, np.empty((0, 2), dtype=np.int64)).tolist() == [0, 1, 2]
+
+
+@pytest.fixture
+def df() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "text": ["short", "the longest text", "a longer text", "other"],
+            "label": [["a"], "b", ["a", "b", "c"], None],
+        },
+        index=pd.Index(["10", "9", "100", "11"], name="pvid"),
+    )
+
+
+@pytest.mark.parametrize(
+    "rule, expected",
+    [
+        ("longest_text", [1, 3]),
+        # pvids are compared as numbers, "9" before "10"
+        ("earliest_pvid", [1, 3]),
+        ("most_labels", [2, 3]),
+    ],
+)
+def test_representative_rules(df, rule, expected):
+    cluster_ids = np.array([0, 0, 0, 1])
+
+    positions = get_representatives(
+        cluster_ids=cluster_ids,
+        priorities=representative_rules[rule](df).to_numpy(),
+    )
+
+    assert positions.tolist() == expected
+
+
+def test_representative_rules_earliest_pvid_column(df):
+    priorities = representative_rules["earliest_pvid"](df.reset_index())
+
+    assert priorities.tolist() == [10, 9, 100, 11]
+
+
+def test_get_representatives_breaks_ties_by_position():
+    positions = get_representatives(
+        cluster_ids=np.array([1, 0, 1, 0]),
+        priorities=np.zeros(4),
+    )
+
+    assert positions.tolist() == [0, 1]
+
+
+def test_filter_similar_text_by_market_in_processes():
+    df = pd.DataFrame(
+        {
+            "market": ["fr", "gb", "gb", "fr", "gb", "de"],
+            "text": [
+                "milk chocolate biscuits",
+                "milk chocolate biscuits",
+                "Milk chocolate biscuits!",
+                "salted butter",
+                "salted butter",
+                "milk chocolate biscuits",
+            ],
+        },
+        index=pd.Index(list("abcdef"), name="pvid"),
+    )
+
+    df_keep, df_remove, df_timings = filter_similar_text_by_market(
+        df,
+        threshold=0.8,
+        n_workers=2,
+    )
+
+    # Duplicates are only removed within a market, the longest text is kept
+    assert df_keep.index.to_list() == ["a", "d", "c", "e", "f"]
+    assert df_remove.index.to_list() == ["b"]
+
+    # Markets in order of first appearance whatever order they finish in
+    assert df_timings.index.to_list() == ["fr", "gb", "de"]
+    assert df_timings["rows_keep"].to_list() == [2, 2, 1]
+
+    df_keep_serial, df_remove_serial, _ = filter_similar_text_by_market(
+        df,
+        threshold=0.8,
+    )
+
+    pd.testing.assert_frame_equal(df_keep, df_keep_serial)
+    pd.testing.assert_frame_equal(df_remove, df_remove_serial)
+
+
+def test_collapse_exact_duplicates():
+    texts = [
+        "Salted butter",
+        "milk chocolate",
+        "SALTED, butter!",
+        "",
+        "chocolate milk",
+        "",
+    ]
+
+    shingles, inverse = collapse_exact_duplicates(get_shingles(texts))
+
+    # Unique shingles in order of first text, unigrams ignore word order
+    assert inverse.tolist() == [0, 1, 0, 2, 1, 2]
+    assert len(shingles) == 3
+
+    for i, text_shingles in enumerate(get_shingles(texts)):
+        np.testing.assert_array_equal(shingles[inverse[i]], text_shingles)
+
+
+def test_collapse_exact_duplicates_keeps_order_sensitive_shingles():
+    texts = ["milk chocolate", "chocolate milk"]
+
+    _, inverse = collapse_exact_duplicates(get_shingles(texts, "word_bigrams"))
+
+    assert inverse.tolist() == [0, 1]
+
+
+def test_filter_similar_text_clusters_exact_duplicates():
+    df = pd.DataFrame(
+        {"text": ["salted butter", "Salted butter!", "milk", "SALTED BUTTER"]}
+    )
+
+    df_keep, df_remove = filter_similar_text(df, threshold=0.9)
+
+    # Collapsed texts join the cluster of their unique shingles
+    assert df_keep.index.to_list() == [1, 2]
+    assert df_remove.index.to_list() == [0, 3]
+    assert df_remove["cluster_id"].to_list() == [df_keep.loc[1, "cluster_id"]] * 2
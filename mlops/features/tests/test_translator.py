@@ -0,0 +1,145 @@
+import asyncio
+import json
+from functools import partial
+
+import httpx
+import pandas as pd
+import pytest
+import requests
+
+from mlops.features.raw.scripts import translator
+from mlops.features.raw.scripts.ratelimit import RateLimiter
+
+
+def get_response(status_code: int, texts: list[str] = None) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status_code
+    response.url = translator.endpoint
+
+    if texts is not None:
+        response._content = json.dumps(
+            [{"translations": [{"text": text.upper(), "to": "en"}]} for text in texts]
+        ).encode()
+
+    return response
+
+
+@pytest.fixture
+def posts(monkeypatch) -> list[list[str]]:
+    """Records the texts of each request, without waiting between them."""
+    monkeypatch.setattr(
+        translator,
+        "rate_limiter",
+        RateLimiter(characters_per_minute=10**9, requests_per_minute=10**9),
+    )
+    monkeypatch.setattr(translator.time, "sleep", lambda seconds: None)
+
+    return []
+
+
+def get_df(n_rows: int) -> pd.DataFrame:
+    return pd.DataFrame(
+        {"text": [f"text {i}" for i in range(n_rows)]},
+        index=pd.Index([str(i) for i in range(n_rows)], name="pvid"),
+    )
+
+
+def test_translate_market_isolates_rejected_texts(monkeypatch, posts):
+    def post(url, json, **kwargs):
+        texts = [item["text"] for item in json]
+        posts.append(texts)
+
+        if "text 7" in texts:
+            return get_response(400)
+
+        return get_response(200, texts)
+
+    monkeypatch.setattr(translator.requests, "post", post)
+
+    df = translator.translate_market("PL", get_df(100))
+
+    assert df["text"].isna().sum() == 1
+    assert pd.isna(df.loc["7", "text"])
+    assert df.loc["8", "text"] == "TEXT 8"
+    assert len(posts) <= 2 * 7 + 1
+
+
+def test_translate_market_does_not_bisect_outage(monkeypatch, posts, tmp_path):
+    def post(url, json, **kwargs):
+        posts.append([item["text"] for item in json])
+        return get_response(503)
+
+    monkeypatch.setattr(translator.requests, "post", post)
+
+    checkpoint_path = tmp_path / "checkpoint.jsonl"
+
+    df = translator.translate_market(
+        "PL",
+        get_df(1_000),
+        checkpoint_path=checkpoint_path,
+    )
+
+    # One packed chunk, retried, then left for the next run
+    assert len(posts) == translator.max_attempts
+    assert df["text"].isna().all()
+    assert translator.read_checkpoint(checkpoint_path) == {}
+
+
+def test_translate_retries_timeouts(monkeypatch, posts):
+    def post(url, json, **kwargs):
+        texts = [item["text"] for item in json]
+        posts.append(texts)
+
+        if len(posts) == 1:
+            raise requests.exceptions.Timeout()
+
+        return get_response(200, texts)
+
+    monkeypatch.setattr(translator.requests, "post", post)
+
+    response = translator.translate(["hej"], timeout=1, from_language="pl")
+
+    assert response == [{"translations": [{"text": "HEJ", "to": "en"}]}]
+    assert len(posts) == 2
+
+
+def test_translate_market_async_matches_sync(monkeypatch, posts):
+    def handler(request: httpx.Request) -> httpx.Response:
+        texts = [item["text"] for item in json.loads(request.content)]
+
+        if "text 7" in texts:
+            return httpx.Response(400)
+
+        return httpx.Response(
+            200,
+            json=[{"translations": [{"text": text.upper()}]} for text in texts],
+        )
+
+    def post(url, json, **kwargs):
+        response = handler(httpx.Request("POST", url, json=json))
+        texts = [item["text"] for item in json]
+
+        return get_response(response.status_code, texts)
+
+    monkeypatch.setattr(
+        translator.httpx,
+        "AsyncClient",
+        partial(httpx.AsyncClient, transport=httpx.MockTransport(handler)),
+    )
+    monkeypatch.setattr(translator.requests, "post", post)
+
+    df_async = asyncio.run(
+        translator.translate_market_async("PL", get_df(3_001), max_characters=100)
+    )
+    df_sync = translator.translate_market("PL", get_df(3_001), max_characters=100)
+
+    assert df_async["text"].isna().sum() == 1
+    assert pd.isna(df_async.loc["7", "text"])
+    pd.testing.assert_frame_equal(df_async, df_sync)
+
+
+def test_headers_without_api_key():
+    assert None not in translator.headers.values()
+
+    # Raises TypeError for None header values
+    httpx.AsyncClient(headers=translator.headers)
@@ -1,14 +1,18 @@
+import hashlib
 import json
 import logging
 import os
+import time
 from pathlib import Path
 
 import spacy
 from azureml.contrib.services.aml_request import AMLRequest, rawhttp
 from azureml.contrib.services.aml_response import AMLResponse
 from pydantic import ValidationError
+from scripts.batcher import MicroBatcher
+from scripts.cache import LRUCache
 from scripts.preprocess import sanitize
-from scripts.translator import translate
+from scripts.translator import translate_cached
 from validate import RequestModel, ResponseModel
 
 logging.basicConfig(
@@ -22,11 +26,29 @@ spacy.require_gpu()
 MODEL_NAME = os.getenv("MODEL_NAME")
 MODEL_VERSION = os.getenv("MODEL_VERSION")
 
+# Cached results are only valid for the model which produced them,
+# the same version is reported in responses
+RESULT_VERSION = f"{MODEL_NAME}:{MODEL_VERSION}"
+
 ENVIRONMENT_NAME = os.getenv("ENVIRONMENT_NAME")
 ENVIRONMENT_VERSION = os.getenv("ENVIRONMENT_VERSION")
 
 AZUREML_MODEL_DIR = os.getenv("AZUREML_MODEL_DIR")
 
+# Number of texts per nlp.pipe batch
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", 64))
+
+# Texts from concurrent requests are batched together up to a max size or wait
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", 128))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", 10))
+
+# Scored texts are cached up to a max number of entries and bytes
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", 10_000))
+RESULT_CACHE_BYTES = int(os.getenv("RESULT_CACHE_BYTES", 100_000_000))
+
+# Must match the deployment request timeout
+REQUEST_TIMEOUT_MS = float(os.getenv("REQUEST_TIMEOUT_MS", 5000))
+
 
 def create_error_response(
     code: int,
@@ -68,6 +90,8 @@ def init():
     global nlp
     global ents_target
     global ents_target_mapping
+    global batcher
+    global result_cache
 
     logging.info("Loading model...")
 
@@ -78,6 +102,17 @@ def init():
         ),
     )
 
+    batcher = MicroBatcher(
+        process=lambda texts: list(nlp.pipe(texts, batch_size=BATCH_SIZE)),
+        max_batch_size=BATCH_MAX_SIZE,
+        max_wait_ms=BATCH_MAX_WAIT_MS,
+    )
+
+    result_cache = LRUCache(
+        max_entries=RESULT_CACHE_SIZE,
+        max_bytes=RESULT_CACHE_BYTES,
+    )
+
     # Trained entities to recognize
     ents_target = []
 
@@ -85,45 +120,49 @@ def init():
     ents_target_mapping = {}
 
 
-@rawhttp
-def run(request: AMLRequest):
-    logging.info("HTTP trigger function processed a request.")
+def get_result_key(
+    text: str,
+    translator_language_code: str,
+) -> str:
+    """Gets a result cache key.
 
-    try:
-        # data = request  # Test locally
-        data = request.get_json()
+    Args:
+        text (str): original text
+        translator_language_code (str): language code of the text
 
-    except ValueError as error:
-        return create_error_response(
-            code=0,
-            message=error.errors(),
-        )
+    Returns:
+        str: hash of the text, language code, model name and version
+    """
+    key = json.dumps(
+        [text, translator_language_code, RESULT_VERSION],
+        ensure_ascii=False,
+    )
 
-    else:
-        try:
-            RequestModel(**data)
+    return hashlib.sha256(key.encode("utf8")).hexdigest()
 
-        except ValidationError as error:
-            # Only keep these keys
-            keys = ["type", "loc", "msg", "input"]
-            errors = [{key: e[key] for key in keys} for e in error.errors()]
 
-            return create_error_response(
-                code=1,
-                message=errors,
-            )
+def score_texts(
+    texts: list[str],
+    translator_language_code: str,
+    start_time: float,
+) -> list[dict]:
+    """Translates, sanitizes and runs texts through the model.
 
-        else:
-            account_id = data.get("accountId")
-            pvid = data.get("externalUid")
-            translator_language_code = data.get("translatorLanguageCode")
-            texts = data.get("texts")
+    Args:
+        texts (list[str]): texts to score
+        translator_language_code (str): language code of the texts
+        start_time (float): monotonic time the request was received
 
-    logging.info(f"Processing request for {account_id=}, {pvid=}...")
+    Raises:
+        TimeoutError: if the model results are not ready within the request timeout
 
+    Returns:
+        list[dict]: one dictionary of 3 sub-dictionaries per text:
+        text_dict, categories_dict, and entities_dict
+    """
     # Only translate if not English
     if translator_language_code not in ["en"]:
-        translation = translate(
+        translation = translate_cached(
             texts=texts,
             timeout=5,
             from_language=translator_language_code,
@@ -133,6 +172,8 @@ def run(request: AMLRequest):
     # text_dict, categories_dict, and entities_dict
     texts_list = list()
 
+    text_dicts = list()
+
     for ind, text in enumerate(texts):
         text_dict = {
             "original": text,
@@ -140,13 +181,6 @@ def run(request: AMLRequest):
             "translation": None,
         }
 
-        categories_dict = {
-            "multiclass": None,
-            "multilabel": list(),
-        }
-
-        entities_dict = {ent: list() for ent in ents_target_mapping.values()}
-
         if translator_language_code not in ["en"]:
             logging.info("Updating text dictionary...")
             text_dict["translation"] = translation[ind]["translations"][0]["text"]
@@ -154,14 +188,31 @@ def run(request: AMLRequest):
         # Make doc from translation if available
         # Sanitize text as models are trained on sanitized corpus
         if text_dict["translation"] is not None:
-            text_sanitized = sanitize(text_dict["translation"])
+            text_dict["sanitized"] = sanitize(text_dict["translation"])
 
         else:
-            text_sanitized = sanitize(text_dict["original"])
+            text_dict["sanitized"] = sanitize(text_dict["original"])
 
-        text_dict["sanitized"] = text_sanitized
+        text_dicts.append(text_dict)
 
-        doc = nlp(text_sanitized)
+    # Texts are batched with texts from concurrent requests
+    # Wait only for what is left of the request timeout
+    timeout = REQUEST_TIMEOUT_MS / 1000 - (time.monotonic() - start_time)
+
+    docs = batcher.submit(
+        [text_dict["sanitized"] for text_dict in text_dicts],
+        timeout=timeout,
+    )
+
+    logging.info(f"{batcher.stats()=}")
+
+    for text_dict, doc in zip(text_dicts, docs):
+        categories_dict = {
+            "multiclass": None,
+            "multilabel": list(),
+        }
+
+        entities_dict = {ent: list() for ent in ents_target_mapping.values()}
 
         # textcat
         logging.info("Updating categories dictionary...")
@@ -195,6 +246,89 @@ def run(request: AMLRequest):
             }
         )
 
+    return texts_list
+
+
+@rawhttp
+def run(request: AMLRequest):
+    start_time = time.monotonic()
+
+    logging.info("HTTP trigger function processed a request.")
+
+    try:
+        # data = request  # Test locally
+        data = request.get_json()
+
+    except ValueError as error:
+        return create_error_response(
+            code=0,
+            message=error.errors(),
+        )
+
+    else:
+        try:
+            RequestModel(**data)
+
+        except ValidationError as error:
+            # Only keep these keys
+            keys = ["type", "loc", "msg", "input"]
+            errors = [{key: e[key] for key in keys} for e in error.errors()]
+
+            return create_error_response(
+                code=1,
+                message=errors,
+            )
+
+        else:
+            account_id = data.get("accountId")
+            pvid = data.get("externalUid")
+            translator_language_code = data.get("translatorLanguageCode")
+            texts = data.get("texts")
+
+    logging.info(f"Processing request for {account_id=}, {pvid=}...")
+
+    keys = [get_result_key(text, translator_language_code) for text in texts]
+
+    results = {}
+
+    for key in keys:
+        if key not in results:
+            result = result_cache.get(key, version=RESULT_VERSION)
+
+            if result is not None:
+                results[key] = result
+
+    # Only score unique texts which were not found in the cache
+    texts_missing = {key: text for key, text in zip(keys, texts) if key not in results}
+
+    logging.info(f"{len(texts_missing)=}, {result_cache.stats()=}")
+
+    if texts_missing:
+        try:
+            results_missing = score_texts(
+                texts=list(texts_missing.values()),
+                translator_language_code=translator_language_code,
+                start_time=start_time,
+            )
+
+        except TimeoutError as error:
+            return create_error_response(
+                code=2,
+                message=str(error),
+            )
+
+        for key, result in zip(texts_missing, results_missing):
+            results[key] = result
+
+            result_cache.put(
+                key,
+                result,
+                size=len(json.dumps(result, ensure_ascii=False)),
+                version=RESULT_VERSION,
+            )
+
+    texts_list = [results[key] for key in keys]
+
     model_dict = {
         "name": MODEL_NAME,
         "version": MODEL_VERSION,
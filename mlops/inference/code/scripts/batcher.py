@@ -0,0 +1,193 @@
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="[%(asctime)s] %(message)s",
+    datefmt="%d/%m/%y %H:%M:%S",
+)
+
+
+class _BatchRequest:
+    """Texts submitted by one caller and the slot to hand its results back."""
+
+    def __init__(
+        self,
+        texts: list[str],
+        deadline: float,
+    ):
+        self.texts = texts
+        self.deadline = deadline
+        self.results = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class MicroBatcher:
+    """Collects texts from concurrent callers and processes them in one batch.
+
+    A background thread waits for the first request, then keeps collecting
+    requests for up to max_wait_ms or until max_batch_size texts are queued.
+    The whole batch is processed with one call and each caller gets back
+    the results for its own texts, in order.
+
+    Requests whose deadline has passed before the batch runs are dropped
+    and their callers get a TimeoutError.
+    """
+
+    def __init__(
+        self,
+        process: Callable[[list[str]], list[Any]],
+        max_batch_size: int = 128,
+        max_wait_ms: float = 10,
+    ):
+        """Starts the batching thread.
+
+        Args:
+            process (Callable[[list[str]], list[Any]]): function to process a batch
+            of texts, must return one result per text
+            max_batch_size (int, optional): max texts per batch. Defaults to 128.
+            max_wait_ms (float, optional): max time to wait for more requests
+            after the first one. Defaults to 10.
+        """
+        self.process = process
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+
+        self._batches = 0
+        self._texts = 0
+        self._max_batch = 0
+        self._timeouts = 0
+
+        self._thread = threading.Thread(
+            target=self._loop,
+            name="micro-batcher",
+            daemon=True,
+        )
+
+        self._thread.start()
+
+    def submit(
+        self,
+        texts: list[str],
+        timeout: float,
+    ) -> list[Any]:
+        """Submits texts and blocks until their results are ready.
+
+        Args:
+            texts (list[str]): texts to process
+            timeout (float): seconds to wait before giving up
+
+        Raises:
+            TimeoutError: if results are not ready within timeout
+
+        Returns:
+            list[Any]: one result per text, in order
+        """
+        request = _BatchRequest(
+            texts=texts,
+            deadline=time.monotonic() + timeout,
+        )
+
+        self._queue.put(request)
+
+        if not request.done.wait(timeout):
+            raise TimeoutError(f"Batch results not ready after {timeout=:.3f}s")
+
+        if request.error is not None:
+            raise request.error
+
+        return request.results
+
+    def stats(self) -> dict:
+        """Gets queue depth and batch size statistics.
+
+        Returns:
+            dict: batching statistics
+        """
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "batches": self._batches,
+                "texts": self._texts,
+                "mean_batch_size": self._texts / self._batches if self._batches else 0,
+                "max_batch_size": self._max_batch,
+                "timeouts": self._timeouts,
+            }
+
+    def _collect(self) -> list[_BatchRequest]:
+        # Block until there is at least one request
+        batch = [self._queue.get()]
+        n_texts = len(batch[0].texts)
+
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+
+        while n_texts < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+
+            if remaining <= 0:
+                break
+
+            try:
+                request = self._queue.get(timeout=remaining)
+
+            except queue.Empty:
+                break
+
+            batch.append(request)
+            n_texts += len(request.texts)
+
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+
+            # Drop requests that already ran out of time
+            now = time.monotonic()
+            expired = [request for request in batch if request.deadline <= now]
+            batch = [request for request in batch if request.deadline > now]
+
+            for request in expired:
+                request.error = TimeoutError("Request expired before processing")
+                request.done.set()
+
+            texts = [text for request in batch for text in request.texts]
+
+            with self._lock:
+                self._timeouts += len(expired)
+
+            if not batch:
+                continue
+
+            try:
+                results = list(self.process(texts))
+
+            except Exception as error:
+                logging.error(f"Batch processing error: {error}")
+
+                for request in batch:
+                    request.error = error
+                    request.done.set()
+
+                continue
+
+            # Hand each caller back the slice of results for its texts
+            start = 0
+
+            for request in batch:
+                end = start + len(request.texts)
+                request.results = results[start:end]
+                request.done.set()
+                start = end
+
+            with self._lock:
+                self._batches += 1
+                self._texts += len(texts)
+                self._max_batch = max(self._max_batch, len(texts))
@@ -0,0 +1,210 @@
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Hashable, Union
+
+
+class LRUCache:
+    """Thread-safe in-memory cache bounded by number of entries and bytes.
+
+    Least recently used entries are evicted first
+    Entries can be tied to the version of whatever produces them, a get or
+    put with another version clears the cache under the same lock
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10_000,
+        max_bytes: int = None,
+    ):
+        """Creates an empty cache.
+
+        Args:
+            max_entries (int, optional): max entries to keep. Defaults to 10_000.
+            max_bytes (int, optional): max total size of entries, as given to put().
+            Defaults to None, no limit.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.version = None
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(
+        self,
+        key: Hashable,
+        version: str = None,
+    ) -> Union[Any, None]:
+        """Gets a value and marks it as recently used.
+
+        Args:
+            key (Hashable): cache key
+            version (str, optional): version the value must have been made by.
+            Defaults to None, any version.
+
+        Returns:
+            Union[Any, None]: cached value or None if missing
+        """
+        with self._lock:
+            self._validate(version)
+
+            if key not in self._entries:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._entries.move_to_end(key)
+
+            return self._entries[key]
+
+    def put(
+        self,
+        key: Hashable,
+        value: Any,
+        size: int = 0,
+        version: str = None,
+    ):
+        """Puts a value and evicts the least recently used entries if full.
+
+        Args:
+            key (Hashable): cache key
+            value (Any): value to cache
+            size (int, optional): size of value in bytes. Defaults to 0.
+            version (str, optional): version the value was made by.
+            Defaults to None, any version.
+        """
+        with self._lock:
+            self._validate(version)
+
+            self._bytes += size - self._sizes.get(key, 0)
+            self._sizes[key] = size
+
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries or (
+                self.max_bytes is not None and self._bytes > self.max_bytes
+            ):
+                key_evicted, _ = self._entries.popitem(last=False)
+                self._bytes -= self._sizes.pop(key_evicted)
+
+    def clear(self):
+        """Removes all entries."""
+        with self._lock:
+            self._clear()
+
+    def _clear(self):
+        self._entries.clear()
+        self._sizes.clear()
+        self._bytes = 0
+
+    def _validate(self, version: Union[str, None]):
+        # Called with the lock held, entries of another version are dropped
+        if version is not None and version != self.version:
+            self._clear()
+            self.version = version
+
+    def stats(self) -> dict:
+        """Gets hit and miss counters.
+
+        Returns:
+            dict: cache statistics
+        """
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class DiskCache:
+    """Key-value cache stored in a SQLite file.
+
+    Survives worker restarts and is shared by workers on the same instance
+    """
+
+    def __init__(self, path: Path):
+        """Opens or creates the cache file.
+
+        Args:
+            path (Path): SQLite file path
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._con = sqlite3.connect(
+            str(path),
+            check_same_thread=False,
+        )
+
+        with self._lock, self._con:
+            self._con.execute("PRAGMA journal_mode=WAL")
+            self._con.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT)"
+            )
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Union[Any, None]:
+        """Gets a value.
+
+        Args:
+            key (str): cache key
+
+        Returns:
+            Union[Any, None]: cached value or None if missing
+        """
+        with self._lock:
+            row = self._con.execute(
+                "SELECT value FROM cache WHERE key = ?",
+                (key,),
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+
+        return json.loads(row[0])
+
+    def put(
+        self,
+        key: str,
+        value: Any,
+    ):
+        """Puts a JSON serializable value.
+
+        Args:
+            key (str): cache key
+            value (Any): value to cache
+        """
+        with self._lock, self._con:
+            self._con.execute(
+                "INSERT OR REPLACE INTO cache (key, value) VALUES (?, ?)",
+                (key, json.dumps(value, ensure_ascii=False)),
+            )
+
+    def stats(self) -> dict:
+        """Gets hit and miss counters.
+
+        Returns:
+            dict: cache statistics
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+            }
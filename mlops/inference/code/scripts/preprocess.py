@@ -1,33 +1,66 @@
 import re
-from unicodedata import normalize
+from typing import Iterable
+from unicodedata import is_normalized, normalize
 
 import ftfy
 
+# Shared by features, training and inference so the model is served text
+# sanitized exactly as it was trained on
+
+# Comma between digits, e.g. '18,1'
+DECIMAL_POINT_PATTERN = re.compile(
+    r"""
+    (\d+)  # One or more digits
+    (\,)   # Comma
+    ([\d]+)  # One or more digits
+    """,
+    flags=re.VERBOSE,
+)
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+# Printable ASCII and common whitespace, with no HTML entities,
+# ftfy leaves these texts unchanged
+FTFY_SAFE_PATTERN = re.compile(r"[\t\n -%'-~]*")
+
 
 def sanitize(text: str) -> str:
     """Sanitizes text.
 
+    Normalize decimal points
+    Normalize unicode
     Remove leading, trailing, or 2+ spaces
 
-    Drop columns rows with any missing values
-    Drop columns with duplicated values
-
     Args:
         text (str): text to sanitize
 
     Returns:
-        pd.DataFrame: dataframe
+        str: sanitized text
     """
     text = normalise_decimal_point(text)
     text = normalize_unicode(text)
     text = text.strip()
 
     # replace 2+ spaces with 1 space
-    text = re.sub(r"\s+", " ", text)
+    text = WHITESPACE_PATTERN.sub(" ", text)
 
     return text
 
 
+def sanitize_texts(texts: Iterable[str]) -> list[str]:
+    """Sanitizes a batch of texts.
+
+    Works on lists or pandas Series
+
+    Args:
+        texts (Iterable[str]): texts to sanitize
+
+    Returns:
+        list[str]: sanitized texts, in order
+    """
+    return [sanitize(text) for text in texts]
+
+
 def normalise_decimal_point(text: str) -> str:
     """Normalises decimal points between digits.
 
@@ -40,36 +73,29 @@ def normalise_decimal_point(text: str) -> str:
     Returns:
         str: normalised text
     """
-    pattern = r"""
-        (\d+)  # One or more digits
-        (\,)   # Comma
-        ([\d]+)  # One or more digits
-        """
-
     # Replace comma with decimal point
-    text = re.sub(
-        pattern,
-        lambda ele: ele[1] + "." + ele[3],
-        text,
-        flags=re.VERBOSE,
-    )
-
-    return text
+    return DECIMAL_POINT_PATTERN.sub(r"\1.\3", text)
 
 
 def normalize_unicode(text: str) -> str:
     """Normalizes unicode.
 
+    Skips ftfy and NFKC for plain ASCII texts which they would not change
+
     Args:
         text (str): text
 
     Returns:
         str: normalized text
     """
+    if text.isascii() and FTFY_SAFE_PATTERN.fullmatch(text):
+        return text
+
     # Fix broken Unicode and mojibake (encoding mix-ups)
     text = ftfy.fix_text(text)
 
     # Compatibility Decomposition, followed by Canonical Composition
-    text = normalize("NFKC", text)
+    if not is_normalized("NFKC", text):
+        text = normalize("NFKC", text)
 
     return text
@@ -1,14 +1,39 @@
+import json
 import logging
 import os
+import threading
+import time
 import uuid
+from pathlib import Path
 from typing import Union
 
 import requests
+from requests.adapters import HTTPAdapter
+from scripts.cache import DiskCache, LRUCache
+from tenacity import (
+    retry,
+    retry_if_exception,
+    stop_after_attempt,
+    stop_after_delay,
+    wait_random_exponential,
+)
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
 
 TRANSLATOR_API_KEY = os.getenv("TRANSLATOR_API_KEY")
-endpoint = r"https://api.cognitive.microsofttranslator.com"
+endpoint = os.getenv(
+    "TRANSLATOR_ENDPOINT",
+    r"https://api.cognitive.microsofttranslator.com",
+)
 location = "northeurope"
 
+# One pooled connection per scoring worker
+WORKER_COUNT = int(os.getenv("WORKER_COUNT", 1))
+
+# Translations are cached in memory and optionally in a SQLite file
+TRANSLATION_CACHE_SIZE = int(os.getenv("TRANSLATION_CACHE_SIZE", 10_000))
+TRANSLATION_CACHE_PATH = os.getenv("TRANSLATION_CACHE_PATH")
+
 logging.basicConfig(
     level=logging.INFO,
     format="[%(asctime)s] %(message)s",
@@ -22,6 +47,146 @@ headers = {
     "X-ClientTraceId": str(uuid.uuid4()),
 }
 
+# Seconds spent opening connections by the current thread, reset per request
+connect_timer = threading.local()
+
+
+class TimedConnection:
+    """Adds the time to open a connection, TCP and TLS, to connect_timer."""
+
+    def connect(self):
+        """Opens the connection."""
+        start_time = time.perf_counter()
+
+        try:
+            super().connect()
+
+        finally:
+            connect_timer.seconds = getattr(connect_timer, "seconds", 0.0) + (
+                time.perf_counter() - start_time
+            )
+
+
+class TimedHTTPConnection(TimedConnection, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(TimedConnection, HTTPSConnection):
+    pass
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose pools time new connections into connect_timer."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        """Creates the pool manager with timed connection pools."""
+        super().init_poolmanager(*args, **kwargs)
+
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool,
+        }
+
+
+# Keep connections alive across requests to skip the TCP and TLS handshakes
+session = requests.Session()
+session.headers.update(headers)
+session.mount(
+    endpoint,
+    TimedHTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=WORKER_COUNT,
+    ),
+)
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Checks if a request error is worth retrying.
+
+    Only throttling (429) and server errors (5xx) are retried
+
+    Args:
+        error (BaseException): raised error
+
+    Returns:
+        bool: True if the request should be retried
+    """
+    return (
+        isinstance(error, requests.exceptions.HTTPError)
+        and error.response is not None
+        and (error.response.status_code == 429 or error.response.status_code >= 500)
+    )
+
+
+translation_cache = LRUCache(max_entries=TRANSLATION_CACHE_SIZE)
+
+if TRANSLATION_CACHE_PATH:
+    translation_cache_disk = DiskCache(Path(TRANSLATION_CACHE_PATH))
+
+else:
+    translation_cache_disk = None
+
+
+@retry(
+    retry=retry_if_exception(is_retryable),
+    wait=wait_random_exponential(multiplier=0.1, max=1),
+    stop=stop_after_attempt(3),
+    reraise=True,
+)
+def post(
+    body: list[dict],
+    params: dict,
+    deadline: float,
+) -> requests.Response:
+    """Posts a request using the pooled session.
+
+    Each attempt is only given the time left until the deadline
+    Timings are logged for the successful attempt only, so they exclude
+    failed attempts and the waits between retries
+
+    Args:
+        body (list[dict]): request body
+        params (dict): request parameters
+        deadline (float): time.monotonic() by which the request must complete
+
+    Returns:
+        requests.Response: response
+    """
+    timeout = deadline - time.monotonic()
+
+    if timeout <= 0:
+        raise requests.exceptions.Timeout(f"No time left, {timeout=:.3f}")
+
+    connect_timer.seconds = 0.0
+    start_time = time.perf_counter()
+
+    response = session.post(
+        endpoint + "/translate",
+        params=params,
+        json=body,
+        timeout=timeout,
+    )
+
+    response.raise_for_status()
+
+    # Elapsed covers sending the request until the headers are parsed,
+    # including opening a connection when none was pooled
+    connect_ms = connect_timer.seconds * 1000
+    headers_ms = response.elapsed.total_seconds() * 1000 - connect_ms
+    body_ms = (time.perf_counter() - start_time) * 1000 - headers_ms - connect_ms
+
+    logging.info(f"{connect_ms=:.1f}, {headers_ms=:.1f}, {body_ms=:.1f}")
+
+    return response
+
 
 def translate(
     texts: list[str],
@@ -67,27 +232,119 @@ def translate(
     }
 
     try:
-        response = requests.post(
-            endpoint + "/translate",
+        # Retry for no longer than the request timeout
+        response = post.retry_with(
+            stop=stop_after_attempt(3) | stop_after_delay(timeout),
+        )(
+            body=body,
             params=params,
-            headers=headers,
-            json=body,
-            timeout=timeout,
+            deadline=time.monotonic() + timeout,
         )
 
     except requests.exceptions.Timeout:
         logging.error(f"TimeoutError after {timeout}")
         return None
 
+    except requests.exceptions.HTTPError as e:
+        logging.error(f"HTTPError: {e}")
+        return None
+
     else:
-        try:
-            response.raise_for_status()
+        response_json = response.json()
+
+        logging.info("Returning translation dictionary...")
+
+        return response_json
+
+
+def get_cache_key(
+    text: str,
+    from_language: str,
+    to_language: str,
+) -> str:
+    """Gets a translation cache key.
+
+    Whitespace is normalized so texts differing only in spacing share a key
+
+    Args:
+        text (str): text to translate
+        from_language (str): language to translate from
+        to_language (str): language to translate to
+
+    Returns:
+        str: cache key
+    """
+    return json.dumps(
+        [from_language, to_language, " ".join(text.split())],
+        ensure_ascii=False,
+    )
+
+
+def translate_cached(
+    texts: list[str],
+    timeout: float,
+    from_language: str,
+    to_language: str = "en",
+) -> Union[list[dict], None]:
+    """Translates texts, only posting those missing from the cache.
+
+    Looks up the in-memory cache first, then the disk cache if configured
+
+    Args:
+        texts (list): a list of texts to translate
+        timeout (float): request timeout
+        from_language (str): language to translate from
+        to_language (str): language to translate to
+
+    Returns:
+        Union[list[dict], None]: list of translation dictionaries as returned by
+        translate() or None if an error is raised
+    """
+    keys = [get_cache_key(text, from_language, to_language) for text in texts]
+
+    translations = {}
+
+    for key in keys:
+        if key in translations:
+            continue
 
-        except requests.exceptions.HTTPError as e:
-            logging.error(f"HTTPError: {e}")
+        translation = translation_cache.get(key)
+
+        if translation is None and translation_cache_disk is not None:
+            translation = translation_cache_disk.get(key)
+
+            if translation is not None:
+                translation_cache.put(key, translation)
+
+        if translation is not None:
+            translations[key] = translation
+
+    # Only post unique texts which were not found in any cache
+    texts_missing = {
+        key: text for key, text in zip(keys, texts) if key not in translations
+    }
+
+    if texts_missing:
+        response = translate(
+            texts=list(texts_missing.values()),
+            timeout=timeout,
+            from_language=from_language,
+            to_language=to_language,
+        )
+
+        if response is None:
             return None
 
-        else:
-            response = response.json()
-            logging.info("Returning translation dictionary...")
-            return response
+        for key, translation in zip(texts_missing, response):
+            translations[key] = translation
+            translation_cache.put(key, translation)
+
+            if translation_cache_disk is not None:
+                translation_cache_disk.put(key, translation)
+
+    logging.info(f"{len(texts_missing)=}, {translation_cache.stats()=}")
+
+    if translation_cache_disk is not None:
+        logging.info(f"{translation_cache_disk.stats()=}")
+
+    return [translations[key] for key in keys]
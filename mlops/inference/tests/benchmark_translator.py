@@ -0,0 +1,168 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import requests
+
+
+class TranslatorHandler(BaseHTTPRequestHandler):
+    """Answers /translate like Azure Translator, after a fixed latency.
+
+    Status codes to answer with are taken in order from the server's
+    status_codes, then 200
+    """
+
+    # Keep connections alive between requests
+    protocol_version = "HTTP/1.1"
+
+    # Send headers and body in one write, small writes on a kept alive
+    # connection otherwise wait for the client's delayed ACK
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        """Returns each text upper cased as its translation."""
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+
+        time.sleep(self.server.latency)
+
+        with self.server.lock:
+            status_code = (
+                self.server.status_codes.pop(0) if self.server.status_codes else 200
+            )
+
+        content = json.dumps(
+            [
+                {"translations": [{"text": item["text"].upper(), "to": "en"}]}
+                for item in body
+            ]
+        ).encode()
+
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        """Silences request logs."""
+
+
+def start_stub_server(
+    latency: float = 0.0,
+    status_codes: list[int] = None,
+) -> ThreadingHTTPServer:
+    """Starts a stub Translator server on a free local port.
+
+    Args:
+        latency (float, optional): seconds before answering. Defaults to 0.0.
+        status_codes (list[int], optional): status codes of the first responses.
+        Defaults to None.
+
+    Returns:
+        ThreadingHTTPServer: running server, call shutdown() to stop it
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), TranslatorHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.status_codes = list(status_codes or [])
+    server.lock = threading.Lock()
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
+
+
+def benchmark(
+    n_requests: int,
+    n_texts: int,
+    latency: float,
+) -> dict:
+    """Compares the pooled translator session with a connection per request.
+
+    The stub server is plain HTTP, so the connection per request only pays
+    the TCP handshake, TLS makes the difference larger against Azure
+
+    Args:
+        n_requests (int): sequential requests per client
+        n_texts (int): texts per request
+        latency (float): stub server latency in seconds
+
+    Returns:
+        dict: mean milliseconds per request of each client
+    """
+    server = start_stub_server(latency=latency)
+    host, port = server.server_address
+    os.environ["TRANSLATOR_ENDPOINT"] = f"http://{host}:{port}"
+
+    # Endpoint is read when the translator is imported
+    sys.path.insert(0, str(Path(__file__).parents[1] / "code"))
+    from scripts import translator
+
+    texts = [f"text {i}" for i in range(n_texts)]
+
+    start_time = time.perf_counter()
+
+    for _ in range(n_requests):
+        translator.translate(texts, timeout=5, from_language="sv")
+
+    pooled_ms = (time.perf_counter() - start_time) * 1000 / n_requests
+
+    start_time = time.perf_counter()
+
+    for _ in range(n_requests):
+        requests.post(
+            translator.endpoint + "/translate",
+            params={"api-version": "3.0", "from": "sv", "to": "en"},
+            json=[{"text": text} for text in texts],
+            timeout=5,
+        ).raise_for_status()
+
+    unpooled_ms = (time.perf_counter() - start_time) * 1000 / n_requests
+
+    server.shutdown()
+
+    return {"pooled_ms": pooled_ms, "unpooled_ms": unpooled_ms}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "-n",
+        "--n_requests",
+        type=int,
+        default=200,
+    )
+
+    parser.add_argument(
+        "-t",
+        "--n_texts",
+        type=int,
+        default=10,
+    )
+
+    parser.add_argument(
+        "-l",
+        "--latency",
+        type=float,
+        default=0.005,
+    )
+
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    print(
+        benchmark(
+            n_requests=args.n_requests,
+            n_texts=args.n_texts,
+            latency=args.latency,
+        )
+    )
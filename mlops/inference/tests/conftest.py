@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Scoring code imports its modules as scripts.*, relative to the code folder
+sys.path.insert(0, str(Path(__file__).parents[1] / "code"))
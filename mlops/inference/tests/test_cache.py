@@ -0,0 +1,44 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from scripts.cache import LRUCache
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2, max_bytes=10)
+
+    cache.put("a", 1, size=4)
+    cache.put("b", 2, size=4)
+    cache.get("a")
+    cache.put("c", 3, size=4)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()["bytes"] == 8
+
+
+def test_lru_cache_drops_other_versions():
+    cache = LRUCache()
+
+    cache.put("a", 1, version="model:1")
+
+    assert cache.get("a", version="model:1") == 1
+    assert cache.get("a", version="model:2") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_lru_cache_versions_across_threads():
+    cache = LRUCache(max_entries=100)
+
+    def put(i: int):
+        version = f"model:{i % 2}"
+        cache.put((version, i), version, size=1, version=version)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(put, range(10_000)))
+
+    # Every entry left was made by the current version, sizes add up
+    stats = cache.stats()
+    values = [cache.get(key) for key in list(cache._entries)]
+
+    assert set(values) <= {cache.version}
+    assert stats["bytes"] == stats["entries"]
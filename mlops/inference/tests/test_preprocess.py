@@ -0,0 +1,72 @@
+from unicodedata import normalize
+
+import ftfy
+import numpy as np
+import pandas as pd
+import pytest
+from scripts.preprocess import normalize_unicode, sanitize_texts
+
+from mlops.features.processed.scripts.preprocess import sanitize, sanitize_column
+
+# Plain ASCII fast path, HTML entities, line breaks, mojibake and ligatures
+TEXTS = [
+    ("Volvo XC60 2.0 D4", "Volvo XC60 2.0 D4"),
+    ("  Price 18,1 kr  ", "Price 18.1 kr"),
+    ("100% & 50$", "100% & 50$"),
+    ("AT&T", "AT&T"),
+    ("Tom &amp; Jerry", "Tom & Jerry"),
+    ("a &lt;b&gt;", "a <b>"),
+    ("line one\r\nline two", "line one line two"),
+    ("old\rmac", "old mac"),
+    ("form\x0cfeed", "form feed"),
+    ("cafÃ©", "café"),
+    ("GrÃ¼ÃŸe", "Grüße"),
+    ("Ã…ngstrÃ¶m", "Ångström"),
+    ("â€œquotedâ€\x9d", '"quoted"'),
+    ("ﬁnance ﬂow", "finance flow"),
+    ("Ｆｕｌｌ width", "Full width"),
+    ("café", "café"),
+    ("", ""),
+]
+
+
+def test_sanitize_texts():
+    texts, expected = zip(*TEXTS)
+
+    assert sanitize_texts(texts) == list(expected)
+
+
+@pytest.mark.parametrize("text", [text for text, _ in TEXTS])
+def test_normalize_unicode_matches_ftfy_nfkc(text):
+    assert normalize_unicode(text) == normalize("NFKC", ftfy.fix_text(text))
+
+
+def test_features_sanitize_matches_inference():
+    texts = [text for text, _ in TEXTS]
+    texts_inference = sanitize_texts(texts)
+
+    # Training data drops empty and duplicated texts
+    expected = (
+        pd.Series(texts_inference, name="text")
+        .replace("", np.nan)
+        .dropna()
+        .drop_duplicates()
+    )
+
+    df = sanitize(pd.DataFrame({"text": texts}), cols=["text"], n_workers=2)
+
+    assert df.index.to_list() == expected.index.to_list()
+    assert [text.encode("utf8") for text in df["text"]] == [
+        text.encode("utf8") for text in expected
+    ]
+
+    # Several chunks across processes come back in order
+    texts_features = sanitize_column(
+        pd.Series(texts, name="text"),
+        n_workers=2,
+        chunk_size=3,
+    )
+
+    assert [text.encode("utf8") for text in texts_features] == [
+        text.encode("utf8") for text in texts_inference
+    ]
@@ -0,0 +1,56 @@
+import time
+
+import pytest
+from benchmark_translator import start_stub_server
+from scripts import translator
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    """Points the translator session at a stub server."""
+
+    def start(**kwargs):
+        server = start_stub_server(**kwargs)
+        host, port = server.server_address
+        stub_endpoint = f"http://{host}:{port}"
+
+        monkeypatch.setattr(translator, "endpoint", stub_endpoint)
+        translator.session.mount(
+            stub_endpoint,
+            translator.TimedHTTPAdapter(pool_connections=1, pool_maxsize=1),
+        )
+        servers.append(server)
+
+        return server
+
+    servers = []
+    yield start
+
+    for server in servers:
+        server.shutdown()
+
+
+def test_translate_retries_within_timeout(stub):
+    stub(latency=0.3, status_codes=[503, 503, 503])
+
+    start_time = time.perf_counter()
+    response = translator.translate(["hej"], timeout=0.5, from_language="sv")
+    elapsed = time.perf_counter() - start_time
+
+    # The retry only gets the time left, not another full timeout
+    assert response is None
+    assert elapsed < 0.65
+
+
+def test_post_times_new_connections_only(stub):
+    stub()
+
+    response = translator.translate(["hej"], timeout=5, from_language="sv")
+
+    assert response == [{"translations": [{"text": "HEJ", "to": "en"}]}]
+    assert translator.connect_timer.seconds > 0
+
+    # Second request reuses the pooled connection
+    translator.translate(["hej"], timeout=5, from_language="sv")
+
+    assert translator.connect_timer.seconds == 0
@@ -16,7 +16,7 @@ df = read_processed_file(
         "features",
         "processed",
         "data",
-        "data_keep.csv",
+        "data_keep.parquet",
     )
 )
 
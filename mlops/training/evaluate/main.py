@@ -14,12 +14,14 @@ from mlops.training.scripts.load import read_processed_file
 
 # %%
 # Load data
+# Same rows as the training corpus, near-duplicates removed
 df = read_processed_file(
     Path(
+        "mlops",
         "features",
         "processed",
         "data",
-        "data.csv",
+        "data_keep.parquet",
     )
 )
 
@@ -3,11 +3,14 @@ from pathlib import Path
 
 import pandas as pd
 
+from mlops.features.scripts.storage import read_dataset
+
 
 def read_processed_file(file_path: Path) -> pd.DataFrame:
     """Reads file as dataframe.
 
-    Convert string list objects into literal list object
+    Parquet stores labels as lists
+    For CSV, convert string list objects into literal list object
 
     Args:
         file_path (Path): file path
@@ -15,6 +18,25 @@ def read_processed_file(file_path: Path) -> pd.DataFrame:
     Returns:
         pd.DataFrame: dataframe
     """
+    if file_path.suffix == ".parquet":
+        df = (
+            read_dataset(
+                file_path,
+                columns=[
+                    "text",
+                    "label",
+                ],
+            )
+            .assign(
+                label=lambda df: df["label"].apply(
+                    lambda labels: [label.upper() for label in labels]
+                )
+            )
+            .dropna()
+        )
+
+        return df
+
     df = (
         pd.read_csv(
             file_path,